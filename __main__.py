@@ -1,4 +1,3 @@
-from src.app import app
 from dotenv import load_dotenv
 from os import environ
 
@@ -7,4 +6,13 @@ load_dotenv(dotenv_path=".env")
 
 
 if __name__ == '__main__':
-    app.run(host=environ.get('API_HOST', '0.0.0.0'), port=int(environ.get('API_PORT', 7000)), debug=True if environ.get("API_DEBUG") == "True" else False)
+    from sanic import Sanic
+    from sanic.worker.loader import AppLoader
+
+    # Les workers chargent l'application depuis src.app : ce fichier, réexécuté par chaque
+    # processus lancé en spawn (workers, pool de conversion), ne crée pas l'application
+    loader = AppLoader("src.app:app")
+    app = loader.load()
+
+    app.prepare(host=environ.get('API_HOST', '0.0.0.0'), port=int(environ.get('API_PORT', 7000)), workers=int(environ.get('API_WORKERS', 1)), debug=True if environ.get("API_DEBUG") == "True" else False)
+    Sanic.serve(primary=app, app_loader=loader)
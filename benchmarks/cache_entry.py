@@ -0,0 +1,65 @@
+"""
+Compare le format binaire des entrées du cache au pickle de la réponse Sanic complète,
+pour un client acceptant chacun des encodages précalculés et pour un client sans compression
+
+Utilisation : python -m benchmarks.cache_entry [nombre d'événements]
+"""
+import asyncio
+import pickle
+import sys
+import time
+import timeit
+
+from .samples import celcat_xml
+from src.components.cache import CacheEntry
+from src.utils.xml_to_ics import convert_xml_to_ics
+from sanic.response import raw
+from types import SimpleNamespace
+
+
+def measure(label: str, dumps, loads, runs: int = 2000) -> None:
+    """
+    Mesure la taille stockée et le temps de lecture (chemin d'un hit du cache)
+
+    :param label: Nom du format
+    :param dumps: Fonction de sérialisation
+    :param loads: Fonction de désérialisation jusqu'à la réponse Sanic
+    :param runs: Nombre d'itérations
+    """
+    data = dumps()
+    hit = timeit.timeit(lambda: loads(data), number=runs) / runs
+    store = timeit.timeit(dumps, number=max(runs // 10, 1)) / max(runs // 10, 1)
+
+    print(f"{label:<24} {len(data):>10} o {hit * 1e6:>10.1f} µs {store * 1e6:>10.1f} µs")
+
+
+def main() -> None:
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    ics = asyncio.run(convert_xml_to_ics(celcat_xml(events)))
+
+    response = raw(body=ics, status=200, content_type="text/calendar")
+    entry = CacheEntry.from_response(response, time.time(), 3600, 1.5)
+
+    print(f"Agenda de {events} événements, {len(response.body)} octets")
+    print(f"Variantes : {', '.join(f'{name} {len(body)} o' for name, body in entry.variants.items())}")
+    print(f"{'Format':<24} {'Stocké':>12} {'Lecture':>13} {'Écriture':>13}")
+
+    measure(
+        "pickle HTTPResponse",
+        lambda: pickle.dumps(response),
+        lambda data: pickle.loads(data),
+    )
+
+    for encoding in (*CacheEntry.ENCODINGS, "identity"):
+        request = SimpleNamespace(headers={"Accept-Encoding": encoding})
+
+        measure(
+            f"CacheEntry ({encoding})",
+            lambda: CacheEntry.from_response(response, time.time(), 3600, 1.5).dumps(),
+            lambda data: CacheEntry.loads(data).to_response(request),
+            runs=200,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Simule des millions d'adresses IP distinctes sur le rate limiter d'un worker (sans Redis),
+pour vérifier que la mémoire utilisée et le coût d'une requête restent constants
+
+L'horloge est simulée : les requêtes arrivent au débit indiqué, chacune depuis une
+nouvelle adresse IP. Les fenêtres terminées sont retirées au fil de l'eau, et le
+nombre de clés suivies reste plafonné par RATELIMIT_MAX_KEYS.
+
+Utilisation : python -m benchmarks.ratelimit [adresses IP] [requêtes par seconde]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from src.components import ratelimit
+from src.config import AppConfig
+from types import SimpleNamespace
+
+
+class Clock:
+    """
+    Horloge simulée, avancée par le benchmark
+    """
+    def __init__(self) -> None:
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+async def run(ips: int, rate: int, memory: bool) -> None:
+    """
+    Envoie une requête par adresse IP et affiche les mesures par tranche
+
+    :param ips: Nombre d'adresses IP distinctes
+    :param rate: Requêtes par seconde (horloge simulée)
+    :param memory: Mesure la mémoire allouée (tracemalloc) plutôt que le temps
+    """
+    clock = Clock()
+    ratelimit.time = clock
+
+    app = SimpleNamespace(
+        config=AppConfig(),
+        ctx=SimpleNamespace(),
+        before_server_stop=lambda func: func,
+    )
+    limiter = ratelimit.Ratelimiter(app)
+    bucket = limiter.DEFAULT
+    windows = limiter.windows
+
+    if memory:
+        tracemalloc.start()
+        print(f"{'Requêtes':>12} {'Clés suivies':>14} {'Mémoire':>12}")
+    else:
+        print(f"{'Requêtes':>12} {'Clés suivies':>14} {'Par requête':>14}")
+
+    step = max(ips // 10, 1)
+    start = time.perf_counter()
+
+    for i in range(ips):
+        clock.now += 1 / rate
+        await limiter.check_ratelimit(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{i >> 24}", bucket)
+
+        if (i + 1) % step == 0:
+            keys = len(windows.get(bucket.ident, ()))
+
+            if memory:
+                current, _ = tracemalloc.get_traced_memory()
+                print(f"{i + 1:>12} {keys:>14} {current / 1024 / 1024:>9.1f} Mo")
+            else:
+                elapsed = time.perf_counter() - start
+                print(f"{i + 1:>12} {keys:>14} {elapsed / step * 1e6:>11.2f} µs")
+                start = time.perf_counter()
+
+    if memory:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    ips = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+
+    print(f"{ips} adresses IP, {rate} requêtes/s, limite de {AppConfig.RATELIMIT_MAX_KEYS} clés\n")
+
+    print("Temps")
+    asyncio.run(run(ips, rate, memory=False))
+
+    print("\nMémoire")
+    asyncio.run(run(ips, rate, memory=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import random
+
+from datetime import date, timedelta
+
+
+def celcat_xml(events: int = 1500, seed: int = 0) -> bytes:
+    """
+    Génère un export XML CELCAT synthétique, proche d'un agenda réel sur une année
+
+    :param events: Nombre d'événements
+    :param seed: Graine du générateur aléatoire
+    :return: Données XML CELCAT
+    """
+    rng = random.Random(seed)
+    start = date(2025, 9, 1)
+
+    rooms = [f"Salle {n} - Bâtiment {b}" for n in range(1, 40) for b in "ABC"]
+    modules = [f"R{n}.{m:02d} - Module &amp; cours {n}" for n in range(1, 6) for m in range(1, 15)]
+    groups = [f"S{n} - Groupe {g}" for n in range(1, 6) for g in "ABCD"]
+    categories = ["CM", "TD", "TP", "Examen"]
+
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', "<timetable>"]
+
+    for i in range(events):
+        week = start + timedelta(weeks=rng.randrange(40))
+        hour = rng.randrange(8, 18)
+
+        lines += [
+            f'<event id="{100000 + i}" timesort="{hour:02d}00" colour="FFFFFF" date="{week.strftime("%d/%m/%Y")}">',
+            f"<day>{rng.randrange(5)}</day>",
+            f"<prettytimes>{hour:02d}:00-{hour + 2:02d}:00 {rng.choice(categories)}</prettytimes>",
+            f"<starttime>{hour:02d}:00</starttime>",
+            f"<endtime>{hour + 2:02d}:00</endtime>",
+            f"<category>{rng.choice(categories)}</category>",
+            "<resources>",
+            f"<module><item>{rng.choice(modules)}</item></module>",
+            f"<group><item>{rng.choice(groups)}</item></group>",
+            f"<room><item>{rng.choice(rooms)}</item></room>",
+            "</resources>",
+            f"<notes>{'Apporter un ordinateur' if rng.random() < 0.2 else ''}</notes>",
+            "</event>",
+        ]
+
+    lines.append("</timetable>")
+
+    return "\n".join(lines).encode()
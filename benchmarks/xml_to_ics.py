@@ -0,0 +1,55 @@
+"""
+Mesure le débit d'analyse du XML CELCAT pour chaque analyseur XML disponible,
+puis le débit de rendu iCalendar et la taille de l'agenda compact
+
+Utilisation : python -m benchmarks.xml_to_ics [nombre d'événements]
+"""
+import sys
+import time
+
+from .samples import celcat_xml
+from src.utils.celcat import BACKENDS
+from src.utils.events import parse_calendar
+from src.utils.xml_to_ics import iter_ics, render_ics
+
+
+def best(func, runs: int = 5) -> float:
+    """
+    Mesure la meilleure durée d'exécution d'une fonction
+
+    :param func: Fonction à mesurer
+    :param runs: Nombre d'exécutions
+    :return: Meilleure durée en secondes
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    return min(durations)
+
+
+def main() -> None:
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    xml = celcat_xml(events)
+
+    print(f"Agenda de {events} événements, {len(xml)} octets de XML")
+    print(f"{'Étape':<20} {'Événements/s':>14} {'Durée':>10}")
+
+    for name in BACKENDS:
+        duration = best(lambda: parse_calendar(xml, backend=name))
+        print(f"{'analyse ' + name:<20} {events / duration:>14,.0f} {duration * 1000:>8.1f} ms")
+
+    calendar = parse_calendar(xml)
+    duration = best(lambda: [None for _ in iter_ics(calendar)])
+    print(f"{'rendu ICS':<20} {events / duration:>14,.0f} {duration * 1000:>8.1f} ms")
+
+    print()
+    print(f"{'ICS':<20} {len(render_ics(calendar)):>10} octets")
+    print(f"{'Agenda compact':<20} {len(calendar.dumps(compress=False)):>10} octets")
+    print(f"{'Agenda compact zlib':<20} {len(calendar.dumps()):>10} octets")
+
+
+if __name__ == "__main__":
+    main()
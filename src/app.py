@@ -1,16 +1,20 @@
 from sanic import Sanic
 from .config import AppConfig
-from .client import Client
 from .components.middleware import Middleware
 from .components.ratelimit import Ratelimiter
 from .components.cache import Cache
+from .components.singleflight import SingleFlight
+from .components.prefetch import Prefetcher
+from .components.converter import Converter
+from .components.breaker import CircuitBreaker
+from .components.budget import OutboundBudget
+from .components.clients import ClientPool
 from .components.blueprint import BlueprintLoader
 from .components.statistics import PrometheusStatistics
 from .components.errors import ErrorHandler
 from dotenv import load_dotenv
 from os import environ
 from textwrap import dedent
-from aiohttp import ClientSession
 from datetime import datetime
 from pytz import timezone
 
@@ -77,10 +81,10 @@ app.ext.openapi.describe(
 )
 
 # Ajoute les statistiques Prometheus
-PrometheusStatistics(app)
+app.ctx.statistics = PrometheusStatistics(app)
 
 # Enregistrement du rate limiter
-app.ctx.ratelimiter = Ratelimiter()
+app.ctx.ratelimiter = Ratelimiter(app)
 
 # Enregistrement des middlewares
 Middleware(app)
@@ -88,6 +92,24 @@ Middleware(app)
 # Enregistrement du cache
 app.ctx.cache = Cache(app)
 
+# Enregistrement du regroupement des appels concurrents
+app.ctx.singleflight = SingleFlight(app)
+
+# Enregistrement du disjoncteur devant CELCAT
+app.ctx.breaker = CircuitBreaker(app)
+
+# Enregistrement du débit maximum des requêtes vers CELCAT
+app.ctx.budget = OutboundBudget(app)
+
+# Enregistrement des sessions CELCAT
+app.ctx.clients = ClientPool(app)
+
+# Enregistrement de la conversion des agendas
+app.ctx.converter = Converter(app)
+
+# Enregistrement du préchargement des agendas populaires
+app.ctx.prefetcher = Prefetcher(app)
+
 # Enregistrement des routes
 BlueprintLoader(app).register()
 
@@ -97,51 +119,12 @@ ErrorHandler(app)
 
 @app.listener("before_server_start")
 async def setup_app(app: Sanic, loop):
-    app.ctx.session = ClientSession()
-
-    app.ctx.client = Client(
-        session=app.ctx.session,
-    )
-    await app.ctx.client.login(
-        username=environ.get("URCA_USERNAME"),
-        password=environ.get("URCA_PASSWORD"),
-    )
-    app.ctx.client_created = datetime.now(tz=timezone("Europe/Paris"))
+    if app.config.PREFETCH_ENABLED:
+        app.add_task(app.ctx.prefetcher.run(), name="prefetch")
 
     print("API démarrée")
 
 
 @app.listener("after_server_stop")
 async def close_app(app: Sanic, loop):
-    await app.ctx.session.close()
-
     print("API arrêtée")
-
-
-@app.on_response
-async def after_request(request, response):
-    """
-    Vérifie si le client doit être régénéré (toutes les 6 heures)
-
-    :param request: Request
-    :param response: Response
-    """
-    if (
-        datetime.now(tz=timezone("Europe/Paris")) - request.app.ctx.client_created
-    ).total_seconds() >= 3600:
-        print("Le client a plus de 1 heures, régénération...")
-
-        new_session = ClientSession()
-
-        client = Client(
-            session=new_session,
-        )
-        await client.login(
-            username=environ.get("URCA_USERNAME"),
-            password=environ.get("URCA_PASSWORD"),
-        )
-        request.app.ctx.client = client
-        await request.app.ctx.session.close()
-        request.app.ctx.session = new_session
-
-        request.app.ctx.client_created = datetime.now(tz=timezone("Europe/Paris"))
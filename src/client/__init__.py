@@ -3,13 +3,17 @@ __title__ = "ReverseURCACelcat"
 __author__ = "Paul Bayfield"
 
 
+from .agenda import Agenda
 from .client import Client
-from .exceptions import InvalidCredentials, UnknownError, UnknownAgenda
+from .exceptions import InvalidCredentials, UnknownError, UnknownAgenda, NotModified, SessionExpired
 
 
 __all__ = [
+    "Agenda",
     "Client",
     "InvalidCredentials",
     "UnknownError",
     "UnknownAgenda",
+    "NotModified",
+    "SessionExpired",
 ]
@@ -0,0 +1,18 @@
+class Agenda:
+    """
+    Agenda récupéré depuis CELCAT, avec ses validateurs HTTP
+    """
+    def __init__(self, xml: str, etag: str = None, last_modified: str = None) -> None:
+        """
+        Initialise l'agenda
+
+        :param xml: L'agenda au format XML
+        :type xml: str
+        :param etag: En-tête ETag de la réponse
+        :type etag: str, optional
+        :param last_modified: En-tête Last-Modified de la réponse
+        :type last_modified: str, optional
+        """
+        self.xml = xml
+        self.etag = etag
+        self.last_modified = last_modified
@@ -1,33 +1,59 @@
+import asyncio
+import random
+
 from .config import config
-from .exceptions import UnknownError, UnknownAgenda
+from .exceptions import UnknownError, UnknownAgenda, NotModified, SessionExpired
 from bs4 import BeautifulSoup
-from aiohttp import ClientSession
+from aiohttp import ClientError, ClientSession
+from typing import Awaitable, Callable
+from urllib.parse import urlparse
+
+
+# Statuts HTTP pour lesquels une requête GET est réessayée
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
 
 
 class CAS:
     """
     Classe de base pour gérer l'authentification CAS
     """
-    def __init__(self, session: ClientSession) -> None:
+    def __init__(self, session: ClientSession, retries: int = 0, backoff: float = 0.5, backoff_max: float = 5, throttle: Callable[[], Awaitable[None]] = None) -> None:
         """
         Initialise la classe CAS avec une session HTTP
 
         :param session: Session HTTP aiohttp
         :type session: ClientSession
+        :param retries: Nombre de nouveaux essais d'une requête GET en échec
+        :type retries: int, optional
+        :param backoff: Délai de base entre deux essais en secondes, doublé à chaque essai
+        :type backoff: float, optional
+        :param backoff_max: Délai maximum entre deux essais en secondes
+        :type backoff_max: float, optional
+        :param throttle: Fonction attendue avant chaque requête HTTP, essais compris (limite de débit)
+        :type throttle: Callable[[], Awaitable[None]], optional
         """
         self.session = session
+        self.throttle = throttle
+
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
 
         self.BASE_URL = config.get('service').get('BASE_URL')
+        self.CAS_HOST = urlparse(config.get('cas').get('BASE_URL')).netloc
 
         self.headers = {
             "User-Agent": config.get('userAgent'),
         }
 
 
-    async def request(self, url: str, method: str, data: dict = None, headers: dict = None, redirect: bool = True, raw: bool = False) -> str:
+    async def request(self, url: str, method: str, data: dict = None, headers: dict = None, redirect: bool = True, raw: bool = False, full: bool = False) -> str:
         """
         Permet d'effectuer une requête HTTP avec la session courante
 
+        Les requêtes GET en échec (erreur réseau, délai dépassé ou statut 429, 502, 503, 504)
+        sont réessayées jusqu'à `retries` fois.
+
         :param url: URL de la requête
         :type url: str
         :param method: Méthode HTTP (GET, POST, etc.)
@@ -40,25 +66,53 @@ class CAS:
         :type redirect: bool, optional
         :param raw: Indique si la réponse brute doit être retournée (True) ou le texte (False)
         :type raw: bool, optional
-        :return: La réponse de la requête (texte, JSON, ou objet ClientResponse brut selon les paramètres)
+        :param full: Indique si les en-têtes de la réponse doivent être retournés avec le texte
+        :type full: bool, optional
+        :return: La réponse de la requête (texte, tuple texte et en-têtes, ou objet ClientResponse brut selon les paramètres)
         :rtype: str
+        :raises NotModified: Si la ressource n'a pas été modifiée depuis la version indiquée dans les en-têtes conditionnels
+        :raises SessionExpired: Si la requête est redirigée vers le CAS (redirections non suivies uniquement)
         """
         if headers:
             hd = headers
         else:
             hd = self.headers
 
-        async with self.session.request(method, url, data=data, headers=hd, allow_redirects=redirect) as response:
-            if raw:
-                return response
-            else:
-                if response.status in [200, 201]:
-                    return await response.text()
-                else:
-                    if response.status == 404:
-                        raise UnknownAgenda()
+        # Seules les requêtes GET, sans effet de bord, sont réessayées
+        retries = self.retries if method.upper() == "GET" else 0
+
+        for attempt in range(retries + 1):
+            if attempt:
+                # Délai exponentiel avec gigue, pour ne pas relancer toutes les requêtes en même temps
+                await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1))))
+
+            if self.throttle:
+                await self.throttle()
+
+            try:
+                async with self.session.request(method, url, data=data, headers=hd, allow_redirects=redirect) as response:
+                    if response.status in RETRY_STATUSES and attempt < retries:
+                        continue
+
+                    if raw:
+                        return response
                     else:
-                        raise UnknownError(f"Erreur lors de la requête HTTP ! Statut: {response.status}")
+                        if response.status in [200, 201]:
+                            if full:
+                                return await response.text(), response.headers
+                            return await response.text()
+                        else:
+                            if response.status == 304:
+                                raise NotModified()
+                            elif response.status in [301, 302, 303, 307, 308] and self.CAS_HOST in response.headers.get("Location", ""):
+                                raise SessionExpired()
+                            elif response.status == 404:
+                                raise UnknownAgenda()
+                            else:
+                                raise UnknownError(f"Erreur lors de la requête HTTP ! Statut: {response.status}")
+            except (ClientError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
 
     async def createSession(self, redirectURL: str) -> bool:
         """
@@ -1,22 +1,32 @@
 from .cas import CAS
 from .config import config
-from .exceptions import InvalidCredentials
+from .agenda import Agenda
+from .exceptions import InvalidCredentials, SessionExpired
 from urllib.parse import urlencode, urljoin
 from aiohttp import ClientSession
+from typing import Awaitable, Callable
 
 
 class Client(CAS):
     """
     Client pour interagir avec le service Celcat de l'URCA
     """
-    def __init__(self, session: ClientSession) -> None:
+    def __init__(self, session: ClientSession, retries: int = 0, backoff: float = 0.5, backoff_max: float = 5, throttle: Callable[[], Awaitable[None]] = None) -> None:
         """
         Initialise le client avec une session HTTP
 
         :param session: Session HTTP aiohttp
         :type session: ClientSession
+        :param retries: Nombre de nouveaux essais d'une requête GET en échec
+        :type retries: int, optional
+        :param backoff: Délai de base entre deux essais en secondes, doublé à chaque essai
+        :type backoff: float, optional
+        :param backoff_max: Délai maximum entre deux essais en secondes
+        :type backoff_max: float, optional
+        :param throttle: Fonction attendue avant chaque requête HTTP, essais compris (limite de débit)
+        :type throttle: Callable[[], Awaitable[None]], optional
         """
-        super().__init__(session)
+        super().__init__(session, retries, backoff, backoff_max, throttle)
 
         self.CAS_BASE_URL = config.get('cas').get('BASE_URL')
         self.SERVICE_URL = config.get('service').get('BASE_URL')
@@ -64,20 +74,51 @@ class Client(CAS):
             raise InvalidCredentials("Impossible de se connecter avec les identifiants fournis ! Vérifiez-les et réessayez.")
 
 
-    async def agenda(self, group_id: str) -> str:
+    async def agenda(self, group_id: str, etag: str = None, last_modified: str = None) -> Agenda:
         """
         Récupère l'agenda du groupe demandé
 
+        Si des validateurs d'une version précédente sont fournis, la requête est conditionnelle
+        et NotModified est levée lorsque l'agenda n'a pas changé.
+
+        Les redirections ne sont pas suivies : une session expirée est redirigée vers le
+        CAS, ce qui lève SessionExpired, tout comme une réponse qui n'est pas du XML
+        (page de connexion).
+
         :param group_id: ID du groupe (ex: g30029)
         :type group_id: str
-        :return: L'agenda au format XML
-        :rtype: str
+        :param etag: ETag de la version précédente
+        :type etag: str, optional
+        :param last_modified: Date de dernière modification de la version précédente
+        :type last_modified: str, optional
+        :return: L'agenda au format XML et ses validateurs
+        :rtype: Agenda
+        :raises NotModified: Si l'agenda n'a pas changé depuis la version précédente
+        :raises SessionExpired: Si la session a expiré
         """
         url = urljoin(self.SERVICE_URL, f"{group_id}.xml")
 
-        res = await self.request(
+        headers = dict(self.headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        res, response_headers = await self.request(
             url=url,
-            method="GET"
+            method="GET",
+            headers=headers,
+            redirect=False,
+            full=True
+        )
+
+        # Une page HTML à la place du XML : la session n'est plus valide
+        head = res[:512].lstrip("\ufeff \t\r\n").lower()
+        if not head.startswith("<") or head.startswith(("<!doctype html", "<html")):
+            raise SessionExpired()
+
+        return Agenda(
+            xml=res,
+            etag=response_headers.get("ETag"),
+            last_modified=response_headers.get("Last-Modified"),
         )
-        
-        return res
@@ -41,3 +41,32 @@ class UnknownAgenda(Exception):
         """
         self.error = error
         super().__init__(self.error)
+
+
+class NotModified(Exception):
+    """
+    Exception levée lorsque la ressource demandée n'a pas été modifiée (HTTP 304)
+    """
+    def __init__(self, error: str = "Ressource non modifiée") -> None:
+        """
+        Initialise l'exception avec un message d'erreur
+
+        :param error: Message d'erreur
+        :type error: str
+        """
+        self.error = error
+        super().__init__(self.error)
+
+
+class SessionExpired(UnknownError):
+    """
+    Exception levée lorsque la session CELCAT a expiré (redirection vers le CAS ou page de connexion)
+    """
+    def __init__(self, error: str = "Session CELCAT expirée") -> None:
+        """
+        Initialise l'exception avec un message d'erreur
+
+        :param error: Message d'erreur
+        :type error: str
+        """
+        super().__init__(error)
@@ -2,6 +2,7 @@ import functools
 
 from .rules import Rules
 from .response import JSON
+from ..utils.events import day_end, day_start
 from sanic.request import Request
 from sanic.response import HTTPResponse
 
@@ -163,3 +164,64 @@ def inputs(*args: Argument) -> callable:
         return wrapped
 
     return wrapper
+
+
+def date_range() -> tuple[Argument, Argument]:
+    """
+    Arguments facultatifs d'une période : start et end (DD-MM-YYYY, inclus), convertis en timestamps.
+
+    À utiliser avec le décorateur valid_date_range, qui vérifie l'ordre des deux dates.
+
+    :return: Les arguments start et end.
+    """
+    return (
+        Argument(
+            name="start",
+            description="Date de début de la période (DD-MM-YYYY, incluse)",
+            methods={
+                "start": Rules.date
+            },
+            call=day_start,
+            required=False,
+            headers=False,
+            allow_multiple=False,
+            deprecated=False,
+        ),
+        Argument(
+            name="end",
+            description="Date de fin de la période (DD-MM-YYYY, incluse)",
+            methods={
+                "end": Rules.date
+            },
+            call=day_end,
+            required=False,
+            headers=False,
+            allow_multiple=False,
+            deprecated=False,
+        ),
+    )
+
+
+def valid_date_range(func) -> callable:
+    """
+    Décorateur vérifiant que la date de début de la période (date_range) précède sa date de fin.
+
+    :param func: La fonction de route à décorer, placée sous le décorateur inputs.
+    :return: La fonction décorée.
+    """
+
+    @functools.wraps(func)
+    async def wrapped(request: Request, **kwargs) -> HTTPResponse:
+        start, end = kwargs.get("start"), kwargs.get("end")
+
+        if start is not None and end is not None and start >= end:
+            return JSON(
+                request=request,
+                success=False,
+                message="La date de début doit précéder ou être égale à la date de fin.",
+                status=400,
+            ).generate()
+
+        return await func(request=request, **kwargs)
+
+    return wrapped
@@ -0,0 +1,175 @@
+import time
+
+from .budget import BudgetExceeded, waited
+from ..client import UnknownError
+from collections import deque
+from sanic import Sanic
+from typing import Awaitable, Callable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class CircuitOpen(UnknownError):
+    """
+    Exception levée lorsqu'un appel à CELCAT est refusé car le disjoncteur est ouvert
+    """
+    def __init__(self, error: str = "CELCAT est indisponible, appel refusé par le disjoncteur") -> None:
+        """
+        Initialise l'exception avec un message d'erreur
+
+        :param error: Message d'erreur
+        :type error: str
+        """
+        super().__init__(error)
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur devant CELCAT, sur chaque worker
+
+    - fermé : les appels passent, leurs résultats sont suivis sur une fenêtre glissante
+    - ouvert : au-delà d'un taux d'échec (les appels trop lents comptant comme des échecs),
+      les appels sont refusés immédiatement pendant BREAKER_OPEN_DURATION
+    - semi-ouvert : passé ce délai, un seul appel d'essai est autorisé ; il referme le
+      disjoncteur s'il réussit, et le rouvre sinon
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, app: Sanic) -> None:
+        """
+        Initialisation de la classe
+
+        :param app: Instance de l'application Sanic
+        """
+        self.app = app
+        self.window = float(app.config.BREAKER_WINDOW)
+        self.min_calls = int(app.config.BREAKER_MIN_CALLS)
+        self.error_rate = float(app.config.BREAKER_ERROR_RATE)
+        self.slow_call = float(app.config.BREAKER_SLOW_CALL)
+        self.open_duration = float(app.config.BREAKER_OPEN_DURATION)
+
+        self.state = self.CLOSED
+        self.opened = 0.0
+        self.probing = False
+
+        # Appels de la fenêtre glissante : (fin de l'appel, échec)
+        self.calls: deque[tuple[float, bool]] = deque()
+        self.failures = 0
+
+
+    async def call(self, func: Callable[[], Awaitable[T]], ignored: tuple[type[Exception], ...] = ()) -> T:
+        """
+        Exécute un appel à CELCAT si le disjoncteur le permet
+
+        :param func: Fonction asynchrone effectuant l'appel
+        :param ignored: Exceptions correspondant à une réponse normale de CELCAT (ex: agenda non modifié)
+        :return: Résultat de l'appel
+        :raises CircuitOpen: Si le disjoncteur est ouvert
+        """
+        self.allow()
+
+        start = time.monotonic()
+        queued = waited.get()
+
+        def duration() -> float:
+            # Le temps d'attente d'un jeton (débit maximum vers CELCAT) ne rend pas l'appel lent
+            return time.monotonic() - start - (waited.get() - queued)
+
+        try:
+            result = await func()
+        except BudgetExceeded:
+            # Requête jamais envoyée, faute de jeton : aucune conclusion sur l'état de CELCAT
+            self.probing = False
+            raise
+        except ignored:
+            self.record(duration(), failed=False)
+            raise
+        except Exception:
+            self.record(duration(), failed=True)
+            raise
+        except BaseException:
+            # Appel annulé : aucune conclusion sur l'état de CELCAT
+            self.probing = False
+            raise
+
+        self.record(duration(), failed=False)
+        return result
+
+
+    def allow(self) -> None:
+        """
+        Vérifie qu'un appel peut être effectué
+
+        :raises CircuitOpen: Si le disjoncteur est ouvert, ou si un appel d'essai est déjà en cours
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened < self.open_duration:
+                self.app.ctx.statistics.breaker_rejections.inc()
+                raise CircuitOpen()
+
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            if self.probing:
+                self.app.ctx.statistics.breaker_rejections.inc()
+                raise CircuitOpen()
+
+            self.probing = True
+
+
+    def record(self, duration: float, failed: bool) -> None:
+        """
+        Enregistre le résultat d'un appel et met à jour l'état du disjoncteur
+
+        :param duration: Durée de l'appel en secondes
+        :param failed: Vrai si l'appel a échoué
+        """
+        failed = failed or duration >= self.slow_call
+
+        if self.state == self.HALF_OPEN:
+            self.probing = False
+
+            if failed:
+                self.open()
+            else:
+                self.close()
+            return
+
+        if self.state == self.OPEN:
+            # Appel commencé avant l'ouverture
+            return
+
+        now = time.monotonic()
+        self.calls.append((now, failed))
+        self.failures += failed
+
+        while self.calls and now - self.calls[0][0] > self.window:
+            _, old = self.calls.popleft()
+            self.failures -= old
+
+        if len(self.calls) >= self.min_calls and self.failures / len(self.calls) >= self.error_rate:
+            self.open()
+
+
+    def open(self) -> None:
+        """
+        Ouvre le disjoncteur : les appels sont refusés pendant BREAKER_OPEN_DURATION
+        """
+        print(f"Disjoncteur CELCAT ouvert pour {self.open_duration:g}s")
+
+        self.state = self.OPEN
+        self.opened = time.monotonic()
+
+
+    def close(self) -> None:
+        """
+        Referme le disjoncteur et oublie les appels précédents
+        """
+        print("Disjoncteur CELCAT refermé")
+
+        self.state = self.CLOSED
+        self.calls.clear()
+        self.failures = 0
@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import time
+import weakref
+
+from ..client import UnknownError
+from contextvars import ContextVar
+from redis.exceptions import RedisError
+from sanic import Sanic
+
+
+# Priorités des requêtes vers CELCAT, la plus petite passant en premier
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Priorité des requêtes vers CELCAT effectuées dans le contexte courant (tâche asyncio)
+priority: ContextVar[int] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Temps total passé à attendre un jeton dans le contexte courant (tâche asyncio), en secondes
+waited: ContextVar[float] = ContextVar("outbound_waited", default=0.0)
+
+
+class BudgetExceeded(UnknownError):
+    """
+    Exception levée lorsqu'une requête vers CELCAT a attendu trop longtemps son tour
+    """
+    def __init__(self, error: str = "Trop de requêtes vers CELCAT, attente maximale dépassée") -> None:
+        """
+        Initialise l'exception avec un message d'erreur
+
+        :param error: Message d'erreur
+        :type error: str
+        """
+        super().__init__(error)
+
+
+class OutboundBudget:
+    """
+    Débit maximum des requêtes vers CELCAT (seau à jetons), partagé entre les workers et les serveurs via Redis
+
+    Les requêtes en attente d'un jeton forment une file par priorité : les requêtes des
+    utilisateurs passent avant les rafraîchissements en arrière-plan (préchargement,
+    régénération du cache), puis dans leur ordre d'arrivée. Une requête qui attend plus
+    que l'attente maximale de sa priorité est abandonnée (BudgetExceeded). Un appel lancé en
+    arrière-plan passe en priorité interactive dès qu'un utilisateur attend son résultat (promote).
+
+    Si Redis est indisponible, le seau est tenu par le worker uniquement.
+    """
+    # KEYS[1] : seau, ARGV : débit (jetons par seconde), capacité
+    # Retourne 0 si un jeton a été pris, sinon le délai avant le prochain jeton en millisecondes
+    TAKE_SCRIPT = """
+        local rate = tonumber(ARGV[1])
+        local burst = tonumber(ARGV[2])
+        local time = redis.call("TIME")
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+        local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+        local tokens = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = math.ceil((1 - tokens) / rate * 1000)
+        end
+
+        redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+        redis.call("PEXPIRE", KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+        return wait
+    """
+
+    def __init__(self, app: Sanic) -> None:
+        """
+        Initialisation de la classe
+
+        :param app: Instance de l'application Sanic
+        """
+        self.app = app
+        self.rate = float(app.config.OUTBOUND_RATE)
+        self.burst = int(app.config.OUTBOUND_BURST)
+        self.max_wait = {
+            INTERACTIVE: float(app.config.OUTBOUND_MAX_WAIT),
+            BACKGROUND: float(app.config.OUTBOUND_BACKGROUND_MAX_WAIT),
+        }
+        self.key = "outbound:celcat"
+
+        # Requêtes en attente : [priorité, ordre d'arrivée, future]
+        self.queue: list[list] = []
+        self.order = itertools.count()
+        self.dispatcher: asyncio.Task | None = None
+        self.script = None
+
+        # Tâches en attente d'un jeton, avec leur entrée dans la file et leur délai d'attente
+        self.waiting: dict[asyncio.Task, tuple[list, asyncio.Timeout]] = {}
+        # Tâches lancées en arrière-plan dont un utilisateur attend le résultat
+        self.promoted: weakref.WeakSet[asyncio.Task] = weakref.WeakSet()
+
+        # Seau local, utilisé sans Redis
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+
+    @property
+    def redis(self):
+        """
+        Connexion Redis ouverte par le cache
+        """
+        cache = getattr(self.app.ctx, "cache", None)
+        return cache.redis if cache else None
+
+
+    async def acquire(self) -> None:
+        """
+        Attend un jeton pour effectuer une requête vers CELCAT, selon la priorité du contexte courant
+
+        :raises BudgetExceeded: Si l'attente maximale de la priorité est dépassée
+        """
+        if self.rate <= 0:
+            return
+
+        start = time.monotonic()
+        task = asyncio.current_task()
+        level = INTERACTIVE if task in self.promoted else priority.get()
+        entry = [level, next(self.order), asyncio.get_running_loop().create_future()]
+        heapq.heappush(self.queue, entry)
+
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.ensure_future(self.dispatch())
+
+        try:
+            async with asyncio.timeout(self.max_wait[level]) as timeout:
+                self.waiting[task] = (entry, timeout)
+                await entry[2]
+        except TimeoutError:
+            self.app.ctx.statistics.outbound_rejections.labels(
+                priority="background" if entry[0] == BACKGROUND else "interactive"
+            ).inc()
+            raise BudgetExceeded() from None
+        finally:
+            self.waiting.pop(task, None)
+            waited.set(waited.get() + time.monotonic() - start)
+
+
+    def promote(self, task: asyncio.Task) -> None:
+        """
+        Passe un appel lancé en arrière-plan en priorité interactive, un utilisateur attendant son résultat
+
+        Si l'appel attend déjà un jeton, il avance dans la file (en gardant son ordre d'arrivée)
+        et son attente est limitée à l'attente maximale interactive.
+
+        :param task: Tâche effectuant l'appel
+        """
+        self.promoted.add(task)
+
+        entry, timeout = self.waiting.get(task, (None, None))
+        if entry is None or entry[0] == INTERACTIVE:
+            return
+
+        entry[0] = INTERACTIVE
+        heapq.heapify(self.queue)
+
+        deadline = asyncio.get_running_loop().time() + self.max_wait[INTERACTIVE]
+        if timeout.when() is None or deadline < timeout.when():
+            timeout.reschedule(deadline)
+
+
+    async def dispatch(self) -> None:
+        """
+        Distribue les jetons aux requêtes en attente, par priorité puis par ordre d'arrivée
+        """
+        while self.queue:
+            # Requêtes abandonnées (attente dépassée, client déconnecté)
+            if self.queue[0][2].done():
+                heapq.heappop(self.queue)
+                continue
+
+            wait = await self.take()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            # Une requête plus prioritaire a pu arriver pendant la prise du jeton
+            while self.queue:
+                _, _, future = heapq.heappop(self.queue)
+
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+
+    async def take(self) -> float:
+        """
+        Prend un jeton dans le seau partagé (ou local sans Redis)
+
+        :return: 0 si un jeton a été pris, sinon le délai avant le prochain jeton en secondes
+        """
+        if self.redis:
+            try:
+                if self.script is None:
+                    self.script = self.redis.register_script(self.TAKE_SCRIPT)
+
+                return int(await self.script(keys=[self.key], args=[self.rate, self.burst])) / 1000
+            except RedisError as e:
+                print(f"Impossible d'obtenir un jeton pour CELCAT dans Redis : {e}")
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+
+        return (1 - self.tokens) / self.rate
@@ -1,18 +1,439 @@
 import redis.asyncio as redis
-import pickle
+import asyncio
+import struct
+import brotli
+import gzip
 import hashlib
 import functools
+import random
+import math
+import time
 
 from sanic import Sanic, Request
-from sanic.response import HTTPResponse, JSONResponse
+from sanic.response import HTTPResponse, JSONResponse, ResponseStream, empty, raw
 from redis import Redis
+from redis.exceptions import RedisError
+from .budget import BACKGROUND, priority
+from .memory import MemoryCache
 from dotenv import load_dotenv
 from os import environ
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable
+from uuid import uuid4
 
 
 load_dotenv(dotenv_path=".env")
 
 
+class CacheEntry:
+    """
+    Entrée du cache, composée d'une réponse et de ses métadonnées d'expiration
+
+    Le corps est compressé une seule fois, à la mise en cache, dans chaque encodage
+    proposé aux clients (brotli et gzip). Le corps non compressé n'est reconstruit
+    que pour les clients qui n'acceptent aucun de ces encodages.
+
+    Format binaire (little-endian) :
+    - en-tête : version (u8), statut (u16), création (f64), durée de vie (f64), temps de calcul (f32)
+    - type de contenu : longueur (u16) + texte
+    - en-têtes conservés : nombre (u8), puis pour chacun longueur (u8) + nom, longueur (u16) + valeur
+    - variantes du corps : nombre (u8), puis pour chacune longueur (u8) + encodage, longueur (u32) + corps
+    """
+    VERSION = 2
+
+    # Encodages précalculés, par ordre de préférence
+    ENCODINGS = ("br", "gzip")
+
+    # Corps en dessous duquel la compression n'est pas utile
+    COMPRESSION_THRESHOLD = 1024
+
+    # En-têtes de la réponse conservés dans le cache
+    HEADERS = ("Content-Disposition", "ETag", "Last-Modified")
+
+    HEADER = struct.Struct("<BHddf")
+
+    def __init__(self, status: int, content_type: str, headers: dict[str, str], variants: dict[str, bytes], created: float, ttl: float, delta: float = 0.0) -> None:
+        """
+        Initialise une entrée du cache
+
+        :param status: Statut HTTP de la réponse
+        :param content_type: Type de contenu de la réponse
+        :param headers: En-têtes conservés de la réponse
+        :param variants: Corps de la réponse, par encodage ("identity", "gzip", "br")
+        :param created: Date de création de l'entrée (timestamp)
+        :param ttl: Durée de vie douce de l'entrée en secondes
+        :param delta: Temps de calcul de la réponse en secondes
+        """
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers
+        self.variants = variants
+        self.created = created
+        self.ttl = ttl
+        self.delta = delta
+
+
+    @classmethod
+    def from_response(cls, response: JSONResponse | HTTPResponse, created: float, ttl: float, delta: float = 0.0) -> "CacheEntry":
+        """
+        Crée une entrée à partir d'une réponse Sanic, en compressant son corps
+
+        :param response: Réponse à mettre en cache
+        :param created: Date de création de l'entrée (timestamp)
+        :param ttl: Durée de vie douce de l'entrée en secondes
+        :param delta: Temps de calcul de la réponse en secondes
+        :return: CacheEntry
+        """
+        body = response.body or b""
+        headers = {
+            name: response.headers[name]
+            for name in cls.HEADERS
+            if name in response.headers
+        }
+
+        # Validateurs calculés une seule fois à la mise en cache, puis servis tels quels
+        headers.setdefault("ETag", f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+        headers.setdefault("Last-Modified", formatdate(created, usegmt=True))
+
+        if len(body) < cls.COMPRESSION_THRESHOLD:
+            variants = {"identity": body}
+        else:
+            variants = {encoding: cls.compress(body, encoding) for encoding in cls.ENCODINGS}
+
+        return cls(
+            status=response.status,
+            content_type=response.content_type or "",
+            headers=headers,
+            variants=variants,
+            created=created,
+            ttl=ttl,
+            delta=delta,
+        )
+
+
+    @staticmethod
+    def compress(body: bytes, encoding: str) -> bytes:
+        """
+        Compresse un corps de réponse
+
+        :param body: Corps de la réponse
+        :param encoding: Encodage (gzip ou br)
+        :return: Corps compressé
+        """
+        if encoding == "br":
+            return brotli.compress(body, quality=9)
+
+        # mtime fixe : une même réponse donne toujours le même corps compressé
+        return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+    @property
+    def body(self) -> bytes:
+        """
+        Corps non compressé de la réponse, décompressé si nécessaire
+        """
+        if "identity" in self.variants:
+            return self.variants["identity"]
+
+        if "gzip" in self.variants:
+            return gzip.decompress(self.variants["gzip"])
+
+        return brotli.decompress(self.variants["br"])
+
+
+    @property
+    def size(self) -> int:
+        """
+        Taille des corps conservés, en octets
+        """
+        return sum(len(body) for body in self.variants.values())
+
+
+    def negotiate(self, request: Request | None) -> str:
+        """
+        Choisit l'encodage du corps selon l'en-tête Accept-Encoding du client
+
+        :param request: Request
+        :return: Encodage ("identity", "gzip" ou "br")
+        """
+        if "identity" in self.variants or request is None:
+            return "identity"
+
+        accepted = {}
+        for part in request.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = part.strip().lower().partition(";")
+
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+
+            accepted[name.strip()] = quality
+
+        best, best_quality = "identity", 0.0
+        for encoding in self.ENCODINGS:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+
+            if encoding in self.variants and quality > best_quality:
+                best, best_quality = encoding, quality
+
+        return best
+
+
+    def etag(self, encoding: str) -> str | None:
+        """
+        ETag de l'une des variantes du corps
+
+        Chaque encodage a son propre ETag, une variante compressée étant un contenu différent.
+
+        :param encoding: Encodage de la variante
+        :return: ETag ou None
+        """
+        etag = self.headers.get("ETag")
+
+        if etag is None or encoding == "identity" or not etag.endswith('"'):
+            return etag
+
+        return f'{etag[:-1]}-{encoding}"'
+
+
+    def validators(self, encoding: str = "identity") -> dict[str, str]:
+        """
+        Validateurs HTTP d'une variante de l'entrée (ETag, Last-Modified)
+
+        :param encoding: Encodage de la variante
+        :return: En-têtes de validation
+        """
+        validators = {}
+
+        if "ETag" in self.headers:
+            validators["ETag"] = self.etag(encoding)
+        if "Last-Modified" in self.headers:
+            validators["Last-Modified"] = self.headers["Last-Modified"]
+
+        return validators
+
+
+    def not_modified(self, request: Request) -> bool:
+        """
+        Indique si le client possède déjà cette version de la réponse (If-None-Match / If-Modified-Since)
+
+        :param request: Request
+        :return: True si une réponse 304 peut être retournée
+        """
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            etags = {self.etag("identity"), *(self.etag(encoding) for encoding in self.variants)}
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or any(tag in etags for tag in tags)
+
+        if_modified_since = request.headers.get("If-Modified-Since")
+        if if_modified_since and "Last-Modified" in self.headers:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+                modified = parsedate_to_datetime(self.headers["Last-Modified"]).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return modified <= since
+
+        return False
+
+
+    def to_not_modified(self, request: Request) -> HTTPResponse:
+        """
+        Construit une réponse 304 vide contenant les validateurs de l'entrée
+
+        :param request: Request
+        :return: HTTPResponse
+        """
+        headers = self.validators(self.negotiate(request))
+        if "identity" not in self.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        return empty(status=304, headers=headers)
+
+
+    def to_response(self, request: Request | None = None) -> HTTPResponse:
+        """
+        Reconstruit la réponse Sanic, avec le corps dans l'encodage accepté par le client
+
+        :param request: Request (None pour le corps non compressé)
+        :return: HTTPResponse
+        """
+        encoding = self.negotiate(request)
+        headers = {**self.headers, **self.validators(encoding)}
+
+        if "identity" not in self.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        if encoding == "identity":
+            body = self.body
+        else:
+            body = self.variants[encoding]
+            headers["Content-Encoding"] = encoding
+
+        return raw(
+            body=body,
+            status=self.status,
+            headers=headers,
+            content_type=self.content_type,
+        )
+
+
+    @property
+    def expires(self) -> float:
+        """
+        Date d'expiration douce de l'entrée (timestamp)
+        """
+        return self.created + self.ttl
+
+
+    def expired(self) -> bool:
+        """
+        Indique si la durée de vie douce de l'entrée est dépassée
+
+        :return: True si l'entrée est périmée
+        """
+        return time.time() >= self.expires
+
+
+    def expires_early(self, beta: float = 1.0) -> bool:
+        """
+        Expiration anticipée probabiliste (XFetch) : plus l'entrée est proche de son
+        expiration et coûteuse à calculer, plus elle a de chances d'être régénérée en avance
+
+        :param beta: Intensité de l'expiration anticipée (0 pour la désactiver)
+        :return: True si l'entrée doit être régénérée
+        """
+        if beta <= 0 or self.delta <= 0:
+            return False
+
+        return time.time() - self.delta * beta * math.log(1.0 - random.random()) >= self.expires
+
+
+    def dumps(self) -> bytes:
+        """
+        Sérialise l'entrée
+
+        :return: Données binaires
+        """
+        content_type = self.content_type.encode()
+
+        parts = [
+            self.HEADER.pack(self.VERSION, self.status, self.created, self.ttl, self.delta),
+            len(content_type).to_bytes(2, "little"),
+            content_type,
+            len(self.headers).to_bytes(1, "little"),
+        ]
+        for name, value in self.headers.items():
+            name, value = name.encode(), str(value).encode()
+            parts += [len(name).to_bytes(1, "little"), name, len(value).to_bytes(2, "little"), value]
+
+        parts.append(len(self.variants).to_bytes(1, "little"))
+        for encoding, body in self.variants.items():
+            encoding = encoding.encode()
+            parts += [len(encoding).to_bytes(1, "little"), encoding, len(body).to_bytes(4, "little"), body]
+
+        return b"".join(parts)
+
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CacheEntry":
+        """
+        Désérialise une entrée
+
+        :param data: Données binaires
+        :return: CacheEntry
+        :raises ValueError: Si le format de l'entrée n'est pas reconnu
+        """
+        data = memoryview(data)
+
+        if not len(data) or data[0] != cls.VERSION:
+            raise ValueError(f"Version d'entrée du cache inconnue : {data[0] if len(data) else None}")
+
+        _, status, created, ttl, delta = cls.HEADER.unpack_from(data)
+
+        offset = cls.HEADER.size
+        length = int.from_bytes(data[offset:offset + 2], "little")
+        content_type = str(data[offset + 2:offset + 2 + length], "utf-8")
+        offset += 2 + length
+
+        headers = {}
+        count = data[offset]
+        offset += 1
+        for _ in range(count):
+            length = data[offset]
+            name = str(data[offset + 1:offset + 1 + length], "utf-8")
+            offset += 1 + length
+            length = int.from_bytes(data[offset:offset + 2], "little")
+            headers[name] = str(data[offset + 2:offset + 2 + length], "utf-8")
+            offset += 2 + length
+
+        variants = {}
+        count = data[offset]
+        offset += 1
+        for _ in range(count):
+            length = data[offset]
+            encoding = str(data[offset + 1:offset + 1 + length], "utf-8")
+            offset += 1 + length
+            length = int.from_bytes(data[offset:offset + 4], "little")
+            variants[encoding] = bytes(data[offset + 4:offset + 4 + length])
+            offset += 4 + length
+
+        if not variants:
+            raise ValueError("Entrée du cache sans corps")
+
+        return cls(status, content_type, headers, variants, created, ttl, delta)
+
+
+class StreamTee:
+    """
+    Intermédiaire conservant une copie des morceaux écrits dans une réponse envoyée par morceaux
+    """
+    def __init__(self, stream: ResponseStream | None) -> None:
+        """
+        Initialise l'intermédiaire
+
+        :param stream: Réponse à laquelle transmettre les morceaux (None pour uniquement les conserver)
+        """
+        self.stream = stream
+        self.chunks: list[bytes] = []
+
+
+    async def write(self, data: str | bytes) -> None:
+        """
+        Conserve un morceau puis le transmet à la réponse
+
+        :param data: Morceau du corps de la réponse
+        """
+        self.chunks.append(data.encode() if isinstance(data, str) else data)
+
+        if self.stream is not None:
+            await self.stream.write(data)
+
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+
+    def to_response(self, stream: ResponseStream) -> HTTPResponse:
+        """
+        Construit une réponse complète à partir des morceaux conservés
+
+        :param stream: Réponse envoyée par morceaux d'origine
+        :return: HTTPResponse
+        """
+        return raw(
+            body=b"".join(self.chunks),
+            status=stream.status,
+            headers=stream.headers,
+            content_type=stream.content_type,
+        )
+
+
 class Cache:
     """
     Classe pour gérer un cache avec Redis (Utilisation de redis-py au lieu de aioredis)
@@ -33,6 +454,19 @@ class Cache:
             451, 500, 501, 502, 503, 504, 505, 506, 507, 508, 510, 511
         }
 
+        # Entrées en cours de régénération sur ce worker
+        self.revalidating: set[str] = set()
+        self.revalidate_timeout = 60
+
+        # Cache en mémoire (L1) devant Redis (L2), invalidé entre les workers via Redis pub/sub
+        self.app = app
+        self.memory = MemoryCache(
+            max_size=int(app.config.CACHE_MEMORY_SIZE),
+            max_age=float(app.config.CACHE_MEMORY_MAX_AGE),
+        )
+        self.worker_id = uuid4().hex.encode()
+        self.invalidation_channel = "cache:invalidate"
+
 
         @app.before_server_start
         async def setup_redis(app, _):
@@ -41,6 +475,9 @@ class Cache:
             """
             self.redis = redis.from_url(redis_url, decode_responses=False)
 
+            if self.memory.max_size:
+                app.add_task(self.listen_invalidations(), name="cache_invalidation")
+
 
         @app.after_server_stop
         async def close_redis(app, _):
@@ -53,22 +490,38 @@ class Cache:
 
     async def get_cache_key(self, request: Request) -> str:
         """
-        Génère une clé de cache basée sur l'URL et les paramètres de requête
+        Génère une clé de cache basée sur le chemin et les paramètres de requête
 
         :param request: Request
         :return: Clé de cache unique
         """
-        raw_key = request.url + str(sorted(request.args.items()))
+        return self.make_key(request.path, request.args.items())
+
+
+    @staticmethod
+    def make_key(path: str, args: list[tuple[str, list[str]]] = ()) -> str:
+        """
+        Génère une clé de cache à partir d'un chemin et de paramètres de requête
+
+        La clé ne dépend pas du domaine, ce qui permet de la calculer hors d'une requête (préchargement).
+        Les valeurs d'un paramètre répété sont triées et dédoublonnées : ?group=a&group=b,
+        ?group=b&group=a et ?group=a&group=b&group=a partagent la même entrée.
+
+        :param path: Chemin de la requête (ex: /v1/agenda/g30029)
+        :param args: Paramètres de requête
+        :return: Clé de cache unique
+        """
+        raw_key = path + str(sorted((name, sorted(set(values))) for name, values in args))
         return hashlib.blake2b(raw_key.encode(), digest_size=16).hexdigest()
 
 
-    async def get(self, request: Request, key: str = None) -> JSONResponse | HTTPResponse | None:
+    async def get(self, request: Request, key: str = None) -> CacheEntry | None:
         """
-        Récupère la réponse mise en cache si elle existe
+        Récupère l'entrée mise en cache si elle existe, en mémoire (L1) puis dans Redis (L2)
 
         :param request: Request
         :param key: Clé de cache (facultatif)
-        :return: JSONResponse ou None
+        :return: CacheEntry ou None
         """
         if not self.redis:
             return None
@@ -78,41 +531,168 @@ class Cache:
         else:
             cache_key = await self.get_cache_key(request)
 
+        entry = self.memory.get(cache_key)
+        if entry:
+            self.app.ctx.statistics.cache_lookups.labels(tier="l1").inc()
+            return entry
+
         cached_data = await self.redis.get(cache_key)
 
         if cached_data:
-            return pickle.loads(cached_data)
+            try:
+                entry = CacheEntry.loads(cached_data)
+            except (ValueError, IndexError, struct.error):
+                # Entrée dans un format incompatible (ancienne version), considérée comme absente
+                entry = None
+
+        if entry:
+            self.app.ctx.statistics.cache_lookups.labels(tier="l2").inc()
 
+            # Les entrées périmées ne sont pas conservées en mémoire, elles sont servies depuis Redis le temps d'être régénérées
+            if not entry.expired():
+                self.memory.set(cache_key, entry, entry.size, entry.expires)
+
+            return entry
+
+        self.app.ctx.statistics.cache_lookups.labels(tier="miss").inc()
         return None
 
 
-    async def set(self, request: Request, response: JSONResponse | HTTPResponse, ttl: int, key: str = None):
+    async def set(self, request: Request, response: JSONResponse | HTTPResponse, ttl: int, key: str = None, stale: int = 0, delta: float = 0.0, jitter: float = 0.0) -> CacheEntry | None:
         """
         Stocke une réponse dans le cache si elle a un statut 200
 
+        Les réponses dégradées (en-tête Warning, ex: agenda périmé car CELCAT est
+        indisponible) ne sont pas stockées : elles ne remplacent pas une entrée existante.
+
         :param request: Request
         :param response: JSONResponse
         :param key: Clé de cache (facultatif)
-        :param ttl: Durée de vie du cache en secondes
+        :param ttl: Durée de vie du cache en secondes (expiration douce si stale > 0)
+        :param stale: Durée supplémentaire pendant laquelle la réponse peut être servie périmée
+        :param delta: Temps de calcul de la réponse en secondes (utilisé pour l'expiration anticipée)
+        :param jitter: Fraction aléatoire retirée de la durée de vie pour étaler les expirations
+        :return: CacheEntry stockée ou None
         """
-        if not self.redis or response.status in self.cache_ignored_statuses:
-            return
+        if not self.redis or response.status in self.cache_ignored_statuses or "Warning" in response.headers:
+            return None
         else:
             if key:
                 cache_key = key
             else:
                 cache_key = await self.get_cache_key(request)
 
-            cached_data = pickle.dumps(response)
-            await self.redis.setex(cache_key, ttl, cached_data)
+            if jitter:
+                ttl = ttl - random.uniform(0, ttl * jitter)
+
+            # La compression des variantes du corps est effectuée hors de la boucle d'événements
+            entry = await asyncio.to_thread(
+                CacheEntry.from_response,
+                response=response,
+                created=time.time(),
+                ttl=ttl,
+                delta=delta,
+            )
+            await self.redis.setex(cache_key, math.ceil(ttl + stale), entry.dumps())
+
+            self.memory.set(cache_key, entry, entry.size, entry.expires)
+            await self.redis.publish(self.invalidation_channel, self.worker_id + b":" + cache_key.encode())
+
+            return entry
+
+
+    async def listen_invalidations(self) -> None:
+        """
+        Écoute les invalidations publiées par les autres workers et retire les entrées correspondantes du cache en mémoire
+        """
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.invalidation_channel)
+
+                    # Des invalidations ont pu être manquées pendant la déconnexion
+                    self.memory.clear()
+
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+
+                        worker_id, _, cache_key = message["data"].partition(b":")
+                        if worker_id != self.worker_id:
+                            self.memory.delete(cache_key.decode())
+            except RedisError as e:
+                print(f"Connexion aux invalidations du cache perdue : {e}")
+
+                self.memory.clear()
+                await asyncio.sleep(1)
+
+
+    async def revalidate(self, cache_key: str, refresh: Callable[[], Awaitable[HTTPResponse]], ttl: int, stale: int, jitter: float) -> None:
+        """
+        Régénère une entrée du cache en arrière-plan
+
+        Un seul worker régénère une même entrée à la fois, grâce à un verrou local et à un verrou Redis.
+
+        :param cache_key: Clé de cache
+        :param refresh: Fonction asynchrone générant la nouvelle réponse
+        :param ttl: Durée de vie douce du cache en secondes
+        :param stale: Durée supplémentaire pendant laquelle la réponse peut être servie périmée
+        :param jitter: Fraction aléatoire retirée de la durée de vie
+        """
+        if cache_key in self.revalidating:
+            return
+
+        self.revalidating.add(cache_key)
+
+        # Les requêtes d'utilisateurs passent avant les régénérations en arrière-plan
+        priority.set(BACKGROUND)
+
+        try:
+            if not await self.redis.set(f"revalidate:{cache_key}", 1, nx=True, ex=self.revalidate_timeout):
+                return
+
+            try:
+                start = time.perf_counter()
+                response = await refresh()
 
+                if isinstance(response, ResponseStream):
+                    tee = StreamTee(None)
+                    await response.streaming_fn(tee)
+                    response = tee.to_response(response)
+                delta = time.perf_counter() - start
 
-def cache(ttl: int = 60, key: str = None):
+                await self.set(None, response, ttl, cache_key, stale, delta, jitter)
+            finally:
+                await self.redis.delete(f"revalidate:{cache_key}")
+        except Exception as e:
+            print(f"Erreur lors de la régénération du cache {cache_key} : {e}")
+        finally:
+            self.revalidating.discard(cache_key)
+
+
+def cache(ttl: int = 60, key: str = None, stale: int = 0, beta: float = 1.0, jitter: float = 0.0):
     """
     Décorateur pour cacher automatiquement toutes les réponses d'une route
 
+    Avec stale > 0, une réponse dont la durée de vie douce est dépassée est servie
+    immédiatement (X-Cache: STALE) pendant qu'elle est régénérée en arrière-plan.
+    Les entrées proches de l'expiration sont régénérées de manière anticipée et
+    probabiliste (XFetch) afin d'étaler les rafraîchissements.
+
+    Les réponses portent un ETag et un Last-Modified : une requête conditionnelle
+    (If-None-Match / If-Modified-Since) sur une réponse inchangée reçoit un 304 vide.
+    Une réponse envoyée par morceaux porte l'ETag fixé par la route (son corps n'étant
+    connu qu'après l'envoi des en-têtes) ; si la requête est conditionnelle, elle est
+    construite entièrement avant d'être comparée.
+
+    Les réponses mises en cache sont servies compressées (brotli ou gzip, selon
+    Accept-Encoding), sans recompression à chaque requête.
+
     :param ttl: Durée de vie du cache en secondes
     :param key: Clé de cache (facultatif)
+    :param stale: Durée supplémentaire pendant laquelle une réponse périmée peut être servie
+    :param beta: Intensité de l'expiration anticipée (0 pour la désactiver)
+    :param jitter: Fraction aléatoire retirée de la durée de vie pour étaler les expirations
     :return: Decorator
     """
 
@@ -120,22 +700,100 @@ def cache(ttl: int = 60, key: str = None):
         @functools.wraps(func)
         async def wrapper(request: Request, *args, **kwargs):
             if not request.app.debug:
-                cached_response = await request.app.ctx.cache.get(request, key)
-                if cached_response:
-                    cached_response.headers["X-Cache"] = "HIT"
-                    cached_response.headers["Cache-Control"] = f"public, max-age={ttl}"
+                cache: Cache = request.app.ctx.cache
+
+                entry = await cache.get(request, key)
+                if entry:
+                    if entry.expired():
+                        status = "STALE"
+                    else:
+                        status = "HIT"
+
+                    if entry.expired() or entry.expires_early(beta):
+                        cache_key = key or await cache.get_cache_key(request)
+                        request.app.add_task(
+                            cache.revalidate(
+                                cache_key,
+                                lambda: func(request, *args, **kwargs),
+                                ttl,
+                                stale,
+                                jitter,
+                            )
+                        )
+
+                    if entry.not_modified(request):
+                        cached_response = entry.to_not_modified(request)
+                    else:
+                        cached_response = entry.to_response(request)
+
+                    cached_response.headers["X-Cache"] = status
+
+                    statistics = request.app.ctx.statistics
+                    statistics.cache_requests.labels(endpoint=statistics.endpoint(request), status=status.lower()).inc()
+
+                    if status == "STALE":
+                        # Déjà périmée : les navigateurs et CDN doivent la revalider à la prochaine requête
+                        cached_response.headers["Cache-Control"] = "public, max-age=0"
+                    else:
+                        cached_response.headers["Cache-Control"] = f"public, max-age={ttl}"
                     cached_response.headers["X-Cache-TTL"] = ttl
 
                     return cached_response
 
+            start = time.perf_counter()
             response = await func(request, *args, **kwargs)
+            delta = time.perf_counter() - start
 
-            if not request.app.debug:
-                await request.app.ctx.cache.set(request, response, ttl, key)
+            conditional = "If-None-Match" in request.headers or "If-Modified-Since" in request.headers
+
+            if not request.app.debug and isinstance(response, ResponseStream) and conditional:
+                # Le corps doit être connu pour pouvoir répondre 304 : il est construit avant d'être envoyé
+                tee = StreamTee(None)
+                await response.streaming_fn(tee)
+                response = tee.to_response(response)
+                delta = time.perf_counter() - start
+
+            if not request.app.debug and isinstance(response, ResponseStream):
+                # Envoyée avant d'être mise en cache, la réponse porte déjà le Last-Modified de l'entrée
+                response.headers.setdefault("Last-Modified", formatdate(time.time(), usegmt=True))
+
+                # Le corps n'est connu qu'une fois envoyé : il est copié au fil de l'envoi puis mis en cache
+                streaming_fn = response.streaming_fn
+
+                async def streaming_fn_tee(stream: ResponseStream) -> None:
+                    tee = StreamTee(stream)
+                    await streaming_fn(tee)
+
+                    try:
+                        await request.app.ctx.cache.set(request, tee.to_response(stream), ttl, key, stale, time.perf_counter() - start, jitter)
+                    except RedisError as e:
+                        print(f"Impossible de mettre en cache la réponse de {request.path} : {e}")
+
+                response.streaming_fn = streaming_fn_tee
+
+                # Envoyée non compressée, mais les réponses suivantes dépendront de Accept-Encoding
+                response.headers["Vary"] = "Accept-Encoding"
+            elif not request.app.debug:
+                entry = await request.app.ctx.cache.set(request, response, ttl, key, stale, delta, jitter)
+
+                if entry:
+                    if entry.not_modified(request):
+                        response = entry.to_not_modified(request)
+                    else:
+                        response = entry.to_response(request)
 
             response.headers["X-Cache"] = "MISS"
-            response.headers["Cache-Control"] = f"public, max-age={ttl}"
-            response.headers["X-Cache-TTL"] = ttl
+
+            if not request.app.debug:
+                statistics = request.app.ctx.statistics
+                statistics.cache_requests.labels(endpoint=statistics.endpoint(request), status="miss").inc()
+
+            if "Warning" in response.headers:
+                # Réponse dégradée, non mise en cache
+                response.headers["Cache-Control"] = "no-cache"
+            else:
+                response.headers["Cache-Control"] = f"public, max-age={ttl}"
+                response.headers["X-Cache-TTL"] = ttl
 
             return response
 
@@ -0,0 +1,404 @@
+import asyncio
+import time
+
+from .budget import BudgetExceeded, waited
+from ..client import Agenda, Client, NotModified, SessionExpired, UnknownAgenda, UnknownError
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector, TraceConfig
+from os import environ
+from sanic import Sanic
+
+
+class PooledClient:
+    """
+    Client CELCAT connecté, avec sa propre session HTTP (et donc ses propres cookies)
+    """
+    def __init__(self, client: Client, session: ClientSession) -> None:
+        """
+        Initialisation de la classe
+
+        :param client: Client connecté
+        :param session: Session HTTP du client
+        """
+        self.client = client
+        self.session = session
+        self.created = time.time()
+
+        # Requêtes en cours et échecs consécutifs
+        self.in_flight = 0
+        self.failures = 0
+
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+
+    def __enter__(self) -> Client:
+        self.in_flight += 1
+        self.idle.clear()
+        return self.client
+
+
+    def __exit__(self, *_) -> None:
+        self.in_flight -= 1
+        if not self.in_flight:
+            self.idle.set()
+
+
+    async def close(self, timeout: float = 60) -> None:
+        """
+        Ferme la session HTTP une fois les requêtes en cours terminées
+
+        :param timeout: Durée maximale d'attente des requêtes en cours en secondes
+        """
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Fermeture d'une session CELCAT avec {self.in_flight} requête(s) en cours")
+
+        await self.session.close()
+
+
+class ClientPool:
+    """
+    Classe pour répartir les requêtes vers CELCAT entre plusieurs sessions connectées
+
+    Chaque requête est envoyée à la session ayant le moins de requêtes en cours. Une
+    session qui échoue plusieurs fois de suite est retirée du pool puis reconnectée
+    en arrière-plan. Une session expirée est reconnectée dès que CELCAT la refuse, et
+    les sessions peuvent aussi être renouvelées en arrière-plan après un âge donné.
+    """
+    def __init__(self, app: Sanic) -> None:
+        """
+        Initialisation de la classe
+
+        :param app: Instance de l'application Sanic
+        """
+        self.app = app
+        self.size = int(app.config.CLIENT_POOL_SIZE)
+        self.max_failures = int(app.config.CLIENT_POOL_MAX_FAILURES)
+
+        self.rotation_interval = float(app.config.CLIENT_ROTATION_INTERVAL)
+
+        self.clients: list[PooledClient] = []
+
+        # Connexions partagées par toutes les sessions, créées au démarrage du worker
+        self.connector: TCPConnector = None
+        self.timeout = ClientTimeout(
+            total=float(app.config.UPSTREAM_TIMEOUT),
+            connect=float(app.config.UPSTREAM_CONNECT_TIMEOUT),
+            sock_read=float(app.config.UPSTREAM_READ_TIMEOUT),
+        )
+        self.trace = TraceConfig()
+        self.trace.on_connection_create_end.append(self.on_connection_created)
+        self.trace.on_connection_reuseconn.append(self.on_connection_reused)
+
+        # Une seule connexion de remplacement à la fois
+        self.lock = asyncio.Lock()
+
+
+        @app.before_server_start
+        async def setup_clients(app, _):
+            """
+            Connexion des sessions avant le démarrage du serveur
+            """
+            self.connector = TCPConnector(
+                limit=int(app.config.UPSTREAM_CONNECTIONS),
+                limit_per_host=int(app.config.UPSTREAM_CONNECTIONS_PER_HOST),
+                keepalive_timeout=float(app.config.UPSTREAM_KEEPALIVE),
+                ttl_dns_cache=int(app.config.UPSTREAM_DNS_TTL),
+            )
+
+            results = await asyncio.gather(
+                *(self.login() for _ in range(self.size)),
+                return_exceptions=True,
+            )
+
+            for result in results:
+                if isinstance(result, PooledClient):
+                    self.clients.append(result)
+                else:
+                    print(f"Impossible de connecter une session CELCAT : {result}")
+                    self.schedule_restore()
+
+            if not self.clients:
+                raise results[0]
+
+            if self.rotation_interval > 0:
+                app.add_task(self.rotate(), name="client_rotation")
+
+
+        @app.after_server_stop
+        async def close_clients(app, _):
+            """
+            Fermeture des sessions après l'arrêt du serveur
+            """
+            await asyncio.gather(
+                *(pooled.session.close() for pooled in self.clients),
+                return_exceptions=True,
+            )
+            self.clients.clear()
+
+            if self.connector:
+                await self.connector.close()
+
+
+    async def login(self) -> PooledClient:
+        """
+        Connecte une nouvelle session à CELCAT
+
+        Chaque session a ses propres cookies, mais les connexions sont partagées.
+
+        :return: Session connectée
+        """
+        session = ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            timeout=self.timeout,
+            trace_configs=[self.trace],
+        )
+
+        start = time.perf_counter()
+        queued = waited.get()
+
+        def elapsed() -> float:
+            # Durée de la connexion sans l'attente des jetons du débit maximum vers CELCAT
+            return time.perf_counter() - start - (waited.get() - queued)
+
+        try:
+            client = Client(
+                session=session,
+                retries=int(self.app.config.UPSTREAM_RETRIES),
+                backoff=float(self.app.config.UPSTREAM_RETRY_BACKOFF),
+                backoff_max=float(self.app.config.UPSTREAM_RETRY_BACKOFF_MAX),
+                # Chaque requête HTTP (connexion, essais) attend son tour dans le débit maximum vers CELCAT
+                throttle=self.app.ctx.budget.acquire,
+            )
+            await client.login(
+                username=environ.get("URCA_USERNAME"),
+                password=environ.get("URCA_PASSWORD"),
+            )
+        except BaseException:
+            self.app.ctx.statistics.cas_login_duration.labels(result="failure").observe(elapsed())
+            await session.close()
+            raise
+
+        self.app.ctx.statistics.cas_login_duration.labels(result="success").observe(elapsed())
+        return PooledClient(client, session)
+
+
+    async def on_connection_created(self, *_) -> None:
+        """
+        Compte les nouvelles connexions vers CELCAT et le CAS
+        """
+        self.app.ctx.statistics.upstream_connections.labels(state="created").inc()
+
+
+    async def on_connection_reused(self, *_) -> None:
+        """
+        Compte les connexions réutilisées (keep-alive) vers CELCAT et le CAS
+        """
+        self.app.ctx.statistics.upstream_connections.labels(state="reused").inc()
+
+
+    def acquire(self) -> PooledClient:
+        """
+        Choisit la session ayant le moins de requêtes en cours
+
+        :return: Session
+        :raises UnknownError: Si aucune session n'est disponible
+        """
+        if not self.clients:
+            raise UnknownError("Aucune session CELCAT disponible !")
+
+        return min(self.clients, key=lambda pooled: pooled.in_flight)
+
+
+    async def agenda(self, group_id: str, etag: str = None, last_modified: str = None) -> Agenda:
+        """
+        Récupère l'agenda d'un groupe avec l'une des sessions du pool
+
+        L'appel passe par le disjoncteur : si CELCAT est indisponible, il est refusé
+        immédiatement. Chaque requête HTTP effectuée (essais et reconnexion compris) attend
+        son tour dans le débit maximum vers CELCAT. Si la session utilisée a expiré, elle est
+        reconnectée (une seule fois pour toutes les requêtes qui l'utilisaient) puis la
+        requête est réessayée une fois.
+
+        :param group_id: ID du groupe (ex: g30029)
+        :param etag: ETag de la version précédente
+        :param last_modified: Date de dernière modification de la version précédente
+        :return: L'agenda au format XML et ses validateurs
+        :raises NotModified: Si l'agenda n'a pas changé depuis la version précédente
+        :raises CircuitOpen: Si le disjoncteur est ouvert
+        :raises BudgetExceeded: Si la requête a attendu son tour trop longtemps
+        """
+        return await self.app.ctx.breaker.call(
+            lambda: self.agenda_with_retry(group_id, etag, last_modified),
+            ignored=(NotModified, UnknownAgenda),
+        )
+
+
+    async def agenda_with_retry(self, group_id: str, etag: str = None, last_modified: str = None) -> Agenda:
+        """
+        Récupère l'agenda d'un groupe, en reconnectant la session une fois si elle a expiré
+
+        :param group_id: ID du groupe (ex: g30029)
+        :param etag: ETag de la version précédente
+        :param last_modified: Date de dernière modification de la version précédente
+        :return: L'agenda au format XML et ses validateurs
+        :raises NotModified: Si l'agenda n'a pas changé depuis la version précédente
+        """
+        pooled = self.acquire()
+
+        try:
+            return await self.fetch(pooled, group_id, etag, last_modified)
+        except SessionExpired:
+            print("Session CELCAT expirée, reconnexion avant un nouvel essai")
+
+        try:
+            await self.replace(pooled)
+        except Exception as e:
+            print(f"Impossible de reconnecter la session CELCAT expirée : {e}")
+            self.evict(pooled)
+
+        return await self.fetch(self.acquire(), group_id, etag, last_modified)
+
+
+    async def fetch(self, pooled: PooledClient, group_id: str, etag: str = None, last_modified: str = None) -> Agenda:
+        """
+        Récupère l'agenda d'un groupe avec une session donnée, en comptant ses échecs consécutifs
+
+        :param pooled: Session à utiliser
+        :param group_id: ID du groupe (ex: g30029)
+        :param etag: ETag de la version précédente
+        :param last_modified: Date de dernière modification de la version précédente
+        :return: L'agenda au format XML et ses validateurs
+        :raises NotModified: Si l'agenda n'a pas changé depuis la version précédente
+        :raises SessionExpired: Si la session a expiré
+        """
+        duration = self.app.ctx.statistics.upstream_duration
+        start = time.perf_counter()
+        queued = waited.get()
+
+        def elapsed() -> float:
+            # Durée de l'appel sans l'attente des jetons du débit maximum vers CELCAT
+            return time.perf_counter() - start - (waited.get() - queued)
+
+        try:
+            with pooled as client:
+                agenda = await client.agenda(
+                    group_id=group_id,
+                    etag=etag,
+                    last_modified=last_modified,
+                )
+        except SessionExpired:
+            # La session sera reconnectée, ce n'est pas un échec de CELCAT
+            duration.labels(status="expired").observe(elapsed())
+            raise
+        except BudgetExceeded:
+            # Requête jamais envoyée, faute de jeton : ni la session ni CELCAT ne sont en cause
+            raise
+        except (UnknownError, ClientError, asyncio.TimeoutError):
+            duration.labels(status="error").observe(elapsed())
+            pooled.failures += 1
+
+            if pooled.failures >= self.max_failures:
+                self.evict(pooled)
+
+            raise
+        except NotModified:
+            duration.labels(status="not_modified").observe(elapsed())
+            pooled.failures = 0
+            raise
+        except UnknownAgenda:
+            duration.labels(status="not_found").observe(elapsed())
+            pooled.failures = 0
+            raise
+
+        duration.labels(status="ok").observe(elapsed())
+        pooled.failures = 0
+        return agenda
+
+
+    def evict(self, pooled: PooledClient) -> None:
+        """
+        Retire une session du pool et la remplace en arrière-plan
+
+        :param pooled: Session à retirer
+        """
+        if pooled not in self.clients:
+            return
+
+        print(f"Session CELCAT retirée du pool après {pooled.failures} échec(s) consécutif(s)")
+
+        self.clients.remove(pooled)
+        self.app.add_task(pooled.close())
+        self.schedule_restore()
+
+
+    def schedule_restore(self) -> None:
+        """
+        Planifie la connexion d'une session en remplacement d'une session retirée
+        """
+        self.app.add_task(self.restore())
+
+
+    async def restore(self) -> None:
+        """
+        Connecte une nouvelle session et l'ajoute au pool, en réessayant avec un délai croissant
+        """
+        delay = 1
+
+        while True:
+            try:
+                self.clients.append(await self.login())
+                return
+            except Exception as e:
+                print(f"Impossible de reconnecter une session CELCAT, nouvel essai dans {delay}s : {e}")
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+    async def replace(self, pooled: PooledClient) -> None:
+        """
+        Remplace une session par une nouvelle session connectée
+
+        La nouvelle session est connectée avant de prendre la place de l'ancienne : les
+        requêtes continuent d'utiliser l'ancienne session pendant la connexion. L'ancienne
+        session est fermée une fois ses requêtes en cours terminées.
+
+        :param pooled: Session à remplacer
+        """
+        async with self.lock:
+            if pooled not in self.clients:
+                # Session déjà remplacée ou retirée entre-temps
+                return
+
+            new = await self.login()
+
+            if pooled not in self.clients:
+                await new.session.close()
+                return
+
+            self.clients[self.clients.index(pooled)] = new
+
+        self.app.add_task(pooled.close())
+
+
+    async def rotate(self) -> None:
+        """
+        Renouvelle en arrière-plan les sessions avant leur expiration côté CAS
+
+        Exécutée sur chaque worker, une session à la fois. En cas d'échec de connexion,
+        l'ancienne session reste utilisée et le renouvellement est réessayé au tour suivant.
+        """
+        while True:
+            await asyncio.sleep(min(60, self.rotation_interval / 10))
+
+            for pooled in list(self.clients):
+                if time.time() - pooled.created < self.rotation_interval:
+                    continue
+
+                try:
+                    await self.replace(pooled)
+                except Exception as e:
+                    print(f"Impossible de renouveler une session CELCAT : {e}")
@@ -0,0 +1,128 @@
+import asyncio
+import multiprocessing
+import sys
+import time
+
+from ..utils.events import Calendar, Event, dump_calendar, parse_calendar
+from ..utils.xml_to_ics import iter_ics
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from sanic import Sanic
+from typing import Iterable, Iterator
+
+
+class Converter:
+    """
+    Classe pour analyser les agendas XML CELCAT et les convertir en iCalendar sans bloquer la boucle d'événements
+
+    Les agendas volumineux sont analysés dans un pool de processus (ou de threads sur une
+    version de Python sans GIL), les petits agendas restent analysés directement.
+    """
+    def __init__(self, app: Sanic) -> None:
+        """
+        Initialisation de la classe
+
+        :param app: Instance de l'application Sanic
+        """
+        self.app = app
+        self.executor: Executor | None = None
+        self.pending = 0
+
+        self.workers = int(app.config.CONVERTER_WORKERS)
+        self.threshold = int(app.config.CONVERTER_INLINE_THRESHOLD)
+
+
+        @app.before_server_start
+        async def setup_executor(app, _):
+            """
+            Création du pool de conversion avant le démarrage du serveur
+            """
+            if self.workers <= 0:
+                return
+
+            if not getattr(sys, "_is_gil_enabled", lambda: True)():
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            else:
+                # spawn évite de dupliquer la boucle d'événements et les connexions du worker
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+
+
+        @app.after_server_stop
+        async def close_executor(app, _):
+            """
+            Arrêt du pool de conversion après l'arrêt du serveur
+            """
+            if self.executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+    def offloaded(self, xml_data: str | bytes) -> bool:
+        """
+        Indique si un agenda doit être analysé dans le pool
+
+        :param xml_data: Données XML CELCAT
+        :return: True si l'analyse est déportée
+        """
+        return self.executor is not None and len(xml_data) >= self.threshold
+
+
+    async def parse(self, xml_data: str | bytes) -> Calendar:
+        """
+        Analyse un agenda XML CELCAT
+
+        :param xml_data: Données XML CELCAT
+        :return: Agenda
+        """
+        mode = "pool" if self.offloaded(xml_data) else "inline"
+        start = time.perf_counter()
+
+        if mode == "inline":
+            calendar = parse_calendar(xml_data)
+        else:
+            self.pending += 1
+
+            try:
+                # Seul l'agenda compact est renvoyé par le processus de conversion
+                data = await asyncio.get_running_loop().run_in_executor(self.executor, dump_calendar, xml_data)
+            finally:
+                self.pending -= 1
+
+            calendar = Calendar.loads(data)
+
+        self.app.ctx.statistics.conversion_duration.labels(mode=mode).observe(time.perf_counter() - start)
+        return calendar
+
+
+    def render(self, events: Iterable[Event]) -> Iterator[str]:
+        """
+        Convertit un agenda (ou une partie de ses événements) en iCalendar, au fil de l'envoi
+
+        :param events: Événements de l'agenda
+        :return: Morceaux du fichier iCalendar
+        """
+        return self.timed(iter_ics(events))
+
+
+    def timed(self, chunks: Iterator[str]) -> Iterator[str]:
+        """
+        Mesure le temps passé à générer les morceaux, sans compter l'attente de leur envoi
+
+        :param chunks: Morceaux du fichier iCalendar
+        :return: Morceaux du fichier iCalendar
+        """
+        elapsed = 0.0
+
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+
+            yield chunk
+
+        self.app.ctx.statistics.conversion_duration.labels(mode="render").observe(elapsed)
@@ -0,0 +1,94 @@
+import time
+
+from collections import OrderedDict
+from typing import Any
+
+
+class MemoryCache:
+    """
+    Cache en mémoire (LRU) limité en octets, utilisé devant Redis sur chaque worker
+    """
+    # Surcoût approximatif d'une entrée (objets Python, clé, métadonnées)
+    OVERHEAD = 256
+
+    def __init__(self, max_size: int, max_age: float) -> None:
+        """
+        Initialisation de la classe
+
+        :param max_size: Taille maximale du cache en octets (0 pour le désactiver)
+        :param max_age: Durée maximale de conservation d'une entrée en secondes
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+
+        self.size = 0
+        self.entries: OrderedDict[str, tuple[Any, int, float]] = OrderedDict()
+
+
+    def get(self, key: str) -> Any | None:
+        """
+        Récupère une entrée si elle existe et n'a pas expiré
+
+        :param key: Clé de cache
+        :return: Valeur ou None
+        """
+        item = self.entries.get(key)
+        if item is None:
+            return None
+
+        value, _, expires = item
+        if time.time() >= expires:
+            self.delete(key)
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+
+    def set(self, key: str, value: Any, size: int, expires: float) -> None:
+        """
+        Ajoute une entrée, en évinçant les moins récemment utilisées si nécessaire
+
+        :param key: Clé de cache
+        :param value: Valeur
+        :param size: Taille de la valeur en octets
+        :param expires: Date d'expiration de l'entrée (timestamp)
+        """
+        size += self.OVERHEAD
+        expires = min(expires, time.time() + self.max_age)
+
+        self.delete(key)
+
+        # Une entrée plus grande qu'un quart du cache évincerait trop d'entrées utiles
+        if size > self.max_size // 4:
+            return
+
+        self.entries[key] = (value, size, expires)
+        self.size += size
+
+        while self.size > self.max_size:
+            _, (_, evicted, _) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+
+    def delete(self, key: str) -> None:
+        """
+        Supprime une entrée si elle existe
+
+        :param key: Clé de cache
+        """
+        item = self.entries.pop(key, None)
+        if item is not None:
+            self.size -= item[1]
+
+
+    def clear(self) -> None:
+        """
+        Vide le cache
+        """
+        self.entries.clear()
+        self.size = 0
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,217 @@
+import asyncio
+import functools
+import time
+
+from .budget import BACKGROUND, priority
+from .cache import Cache
+from .response import Raw
+from ..utils.agenda import fetch_events, CACHE_TTL, CACHE_STALE, CACHE_JITTER
+from collections import Counter
+from sanic import Sanic, Request
+from sanic.response import HTTPResponse
+from uuid import uuid4
+
+
+class Prefetcher:
+    """
+    Classe pour précharger les agendas les plus demandés avant l'expiration de leur cache
+
+    Le nombre de requêtes par groupe est compté localement puis agrégé dans Redis (par tranche
+    d'une heure), afin que la popularité soit partagée entre tous les workers. Les groupes peu
+    demandés ne sont pas préchargés et restent récupérés à la demande.
+    """
+    def __init__(self, app: Sanic) -> None:
+        """
+        Initialisation de la classe
+
+        :param app: Instance de l'application Sanic
+        """
+        self.app = app
+        self.counts: Counter[str] = Counter()
+        self.worker_id = uuid4().hex
+
+        self.interval = int(app.config.PREFETCH_INTERVAL)
+        self.top = int(app.config.PREFETCH_TOP)
+        self.min_requests = int(app.config.PREFETCH_MIN_REQUESTS)
+        self.lead = int(app.config.PREFETCH_LEAD)
+        self.semaphore = asyncio.Semaphore(int(app.config.PREFETCH_CONCURRENCY))
+
+
+    def record(self, group: str) -> None:
+        """
+        Enregistre une requête pour un groupe
+
+        :param group: ID du groupe
+        """
+        self.counts[group] += 1
+
+
+    @staticmethod
+    def popularity_key(hour: int) -> str:
+        """
+        Clé Redis du classement de popularité pour une tranche d'une heure
+
+        :param hour: Numéro de l'heure (timestamp // 3600)
+        :return: Clé Redis
+        """
+        return f"prefetch:popularity:{hour}"
+
+
+    async def flush(self) -> None:
+        """
+        Envoie les compteurs locaux vers Redis en une seule requête groupée
+        """
+        if not self.counts:
+            return
+
+        counts, self.counts = self.counts, Counter()
+        key = self.popularity_key(int(time.time()) // 3600)
+
+        async with self.app.ctx.cache.redis.pipeline(transaction=False) as pipe:
+            for group, count in counts.items():
+                pipe.zincrby(key, count, group)
+            pipe.expire(key, 2 * 3600)
+            await pipe.execute()
+
+
+    async def hottest(self) -> list[str]:
+        """
+        Retourne les groupes les plus demandés sur l'heure courante et l'heure précédente
+
+        :return: Liste des ID de groupes, du plus demandé au moins demandé
+        """
+        hour = int(time.time()) // 3600
+        scores: Counter[str] = Counter()
+
+        async with self.app.ctx.cache.redis.pipeline(transaction=False) as pipe:
+            for key in (self.popularity_key(hour), self.popularity_key(hour - 1)):
+                pipe.zrevrange(key, 0, self.top - 1, withscores=True)
+            results = await pipe.execute()
+
+        for result in results:
+            for group, score in result:
+                scores[group.decode()] += score
+
+        return [
+            group
+            for group, score in scores.most_common(self.top)
+            if score >= self.min_requests
+        ]
+
+
+    async def expiring(self, groups: list[str]) -> list[str]:
+        """
+        Filtre les groupes dont l'entrée du cache est absente ou expire bientôt
+
+        :param groups: Liste des ID de groupes
+        :return: Groupes à précharger
+        """
+        async with self.app.ctx.cache.redis.pipeline(transaction=False) as pipe:
+            for group in groups:
+                pipe.ttl(Cache.make_key(f"/v1/agenda/{group}"))
+            ttls = await pipe.execute()
+
+        # La durée de vie Redis inclut la période pendant laquelle l'entrée peut être servie périmée
+        return [
+            group
+            for group, ttl in zip(groups, ttls)
+            if ttl < 0 or ttl - CACHE_STALE < self.lead
+        ]
+
+
+    async def refresh(self, group: str) -> None:
+        """
+        Régénère l'entrée du cache d'un groupe
+
+        :param group: ID du groupe
+        """
+        async with self.semaphore:
+            try:
+                start = time.perf_counter()
+                calendar = await fetch_events(
+                    app=self.app,
+                    group=group,
+                )
+
+                if calendar.stale:
+                    # CELCAT est indisponible : l'entrée actuelle du cache est conservée
+                    return
+
+                ics = b"".join(chunk.encode() for chunk in self.app.ctx.converter.render(calendar))
+                delta = time.perf_counter() - start
+
+                response = Raw(
+                    request=None,
+                    success=True,
+                    data=ics,
+                    status=200,
+                    content_type="text/calendar",
+                ).generate()
+
+                # Même ETag que la réponse envoyée par morceaux par la route
+                etag = calendar.etag()
+                if etag:
+                    response.headers["ETag"] = etag
+
+                await self.app.ctx.cache.set(
+                    None,
+                    response,
+                    CACHE_TTL,
+                    Cache.make_key(f"/v1/agenda/{group}"),
+                    CACHE_STALE,
+                    delta,
+                    CACHE_JITTER,
+                )
+            except Exception as e:
+                # Un groupe en erreur (CELCAT, Redis, agenda illisible) ne doit pas arrêter le préchargement
+                print(f"Impossible de précharger l'agenda {group} : {e}")
+
+
+    async def run(self) -> None:
+        """
+        Boucle de préchargement, exécutée en arrière-plan sur chaque worker
+
+        Chaque worker envoie ses compteurs, puis un seul worker par intervalle (verrou Redis)
+        précharge les groupes populaires dont le cache expire bientôt.
+        """
+        # Les requêtes d'utilisateurs passent avant le préchargement
+        priority.set(BACKGROUND)
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            if not self.app.ctx.cache.redis:
+                continue
+
+            try:
+                await self.flush()
+
+                if not await self.app.ctx.cache.redis.set("prefetch:leader", self.worker_id, nx=True, ex=self.interval):
+                    continue
+
+                groups = await self.expiring(await self.hottest())
+            except Exception as e:
+                print(f"Erreur lors du préchargement : {e}")
+                continue
+
+            if groups:
+                print(f"Préchargement de {len(groups)} agendas...")
+
+                await asyncio.gather(*[self.refresh(group) for group in groups], return_exceptions=True)
+
+
+def popular(argument: str):
+    """
+    Décorateur pour comptabiliser les requêtes par groupe, utilisé pour le préchargement
+
+    :param argument: Nom de l'argument contenant l'ID du groupe
+    :return: Decorator
+    """
+    def wrapper(func) -> callable:
+        @functools.wraps(func)
+        async def wrapped(request: Request, *args, **kwargs) -> HTTPResponse:
+            request.app.ctx.prefetcher.record(kwargs[argument])
+
+            return await func(request, *args, **kwargs)
+        return wrapped
+    return wrapper
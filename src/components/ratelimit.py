@@ -1,8 +1,13 @@
+import asyncio
 import binascii
 import functools
+import math
 import time
 
+from collections import OrderedDict
 from ..exceptions.ratelimit import RatelimitException
+from redis.exceptions import RedisError
+from sanic import Sanic
 from sanic.request import Request
 from sanic.response import HTTPResponse
 
@@ -21,19 +26,148 @@ class Bucket:
         self.secs = secs
 
 
+class Window:
+    """
+    État local d'une fenêtre de rate limiting pour une clé et un bucket
+
+    :param start: Début de la fenêtre (timestamp)
+    :param previous: Requêtes connues de la fenêtre précédente
+    """
+    __slots__ = ("start", "used", "pending", "previous")
+
+    def __init__(self, start: int, previous: int = 0) -> None:
+        self.start = start
+
+        # Requêtes comptées par Redis (tous workers confondus) lors de la dernière synchronisation
+        self.used = 0
+        # Requêtes acceptées localement, pas encore envoyées à Redis
+        self.pending = 0
+        # Requêtes de la fenêtre précédente, comptées en partie par la fenêtre glissante
+        self.previous = previous
+
+
 class Ratelimiter:
     """
-    Classe permettant de gérer les rate limits
+    Classe permettant de gérer les rate limits, partagées entre les workers et les serveurs via Redis
+
+    Les requêtes sont comptées par fenêtre glissante : un compteur par fenêtre fixe
+    (alignée sur l'heure) est tenu dans Redis, et une requête est comparée à la limite
+    avec le compteur de la fenêtre courante, plus celui de la fenêtre précédente pondéré
+    par la part de celle-ci encore couverte. Un client ne peut donc pas envoyer deux fois
+    la limite de part et d'autre d'un changement de fenêtre.
+
+    Un script Lua applique atomiquement un lot d'incréments, et renvoie pour chaque clé
+    les compteurs des fenêtres courante et précédente. Tant qu'une clé est loin de sa
+    limite (moins de RATELIMIT_LOCAL_SHARE de la limite), ses requêtes sont acceptées
+    localement et envoyées à Redis par lots toutes les RATELIMIT_FLUSH_INTERVAL secondes,
+    ou dès que RATELIMIT_BATCH_SIZE requêtes sont en attente. Au-delà, chaque requête
+    est comptée directement dans Redis.
+
+    Si Redis est indisponible, les requêtes sont comptées sur le worker uniquement.
+
+    Sur chaque worker, les fenêtres d'un bucket sont rangées par date de début : les
+    fenêtres qui ne comptent plus (terminées depuis plus d'une durée de bucket) sont
+    retirées par le début de la file, quelques-unes à chaque requête, sans parcours
+    complet. Au-delà de RATELIMIT_MAX_KEYS clés suivies par bucket, les plus anciennes
+    sont oubliées.
+    """
+    # Fenêtres qui ne comptent plus retirées au maximum à chaque requête
+    EXPIRE_BATCH = 64
+
+    # KEYS : compteurs des fenêtres courante et précédente de chaque clé,
+    # ARGV : incrément et durée de vie du compteur de chaque fenêtre courante
+    INCREMENT_SCRIPT = """
+        local counts = {}
+        for i = 1, #KEYS, 2 do
+            local increment = tonumber(ARGV[i])
+            local count = redis.call("INCRBY", KEYS[i], increment)
+            if count == increment then
+                redis.call("EXPIRE", KEYS[i], ARGV[i + 1])
+            end
+            counts[i] = count
+            counts[i + 1] = tonumber(redis.call("GET", KEYS[i + 1]) or 0)
+        end
+        return counts
     """
-    def __init__(self) -> None:
+
+    def __init__(self, app: Sanic) -> None:
         """
         Initialisation de la classe
+
+        :param app: Instance de l'application Sanic
         """
-        self.ratelimits = {}
-        self.last_ratelimit_cleanup = int(time.time())
+        self.app = app
+        self.flush_interval = float(app.config.RATELIMIT_FLUSH_INTERVAL)
+        self.local_share = float(app.config.RATELIMIT_LOCAL_SHARE)
+        self.batch_size = int(app.config.RATELIMIT_BATCH_SIZE)
+
+        self.max_keys = int(app.config.RATELIMIT_MAX_KEYS)
+
+        # Fenêtres de chaque bucket par clé, de la plus ancienne à la plus récente
+        self.windows: dict[int, OrderedDict[str, Window]] = {}
 
         self.DEFAULT = Bucket("default", 100, 60)
 
+        # Fenêtres ayant des requêtes à envoyer à Redis, avec leur clé et leur bucket
+        self.dirty: dict[Window, tuple[str, Bucket]] = {}
+        self.flushing: asyncio.Task | None = None
+        self.script = None
+
+
+        @app.before_server_stop
+        async def flush_ratelimits(app, _):
+            """
+            Envoie les dernières requêtes comptées à Redis avant l'arrêt du serveur
+            """
+            await self.flush()
+
+
+    @property
+    def redis(self):
+        """
+        Connexion Redis ouverte par le cache
+        """
+        cache = getattr(self.app.ctx, "cache", None)
+        return cache.redis if cache else None
+
+
+    @staticmethod
+    def redis_key(key: str, bucket: Bucket, start: int) -> str:
+        """
+        Clé Redis du compteur d'une fenêtre
+
+        :param key: Clé de la requête
+        :param bucket: Bucket de rate limiting
+        :param start: Début de la fenêtre
+        :return: Clé Redis
+        """
+        return f"ratelimit:{bucket.ident}:{key}:{start}"
+
+
+    async def increment(self, windows: list[tuple[str, Bucket, Window, int]]) -> list[tuple[int, int]]:
+        """
+        Incrémente les compteurs de plusieurs fenêtres dans Redis, en un seul aller-retour
+
+        :param windows: Clé, bucket, fenêtre et incrément de chaque compteur
+        :return: Nombre de requêtes de chaque fenêtre et de la fenêtre précédente, tous workers confondus
+        :raises RedisError: Si Redis est indisponible
+        """
+        if self.script is None:
+            self.script = self.redis.register_script(self.INCREMENT_SCRIPT)
+
+        keys = []
+        args = []
+        for key, bucket, window, increment in windows:
+            keys.extend((
+                self.redis_key(key, bucket, window.start),
+                self.redis_key(key, bucket, window.start - bucket.secs),
+            ))
+            # Le compteur sert encore de fenêtre précédente pendant la fenêtre suivante
+            args.extend((increment, bucket.secs * 2 + 1))
+
+        counts = await self.script(keys=keys, args=args)
+        return list(zip(counts[::2], counts[1::2]))
+
 
     async def check_ratelimit(self, key: str, bucket: Bucket) -> dict:
         """
@@ -43,62 +177,172 @@ class Ratelimiter:
         :param bucket: Bucket de rate limiting
         :return: Headers de la requête
         """
-        await self.cleanup()
+        now = time.time()
+        current_time = int(now)
+        window_start = current_time // bucket.secs * bucket.secs
 
-        current_time = int(time.time())
-        self.ratelimits.setdefault(key, {})
+        # Part de la fenêtre précédente encore couverte par la fenêtre glissante
+        weight = 1 - (now - window_start) / bucket.secs
 
-        window_start = current_time // bucket.secs * bucket.secs
+        windows = self.windows.get(bucket.ident)
+        if windows is None:
+            windows = self.windows[bucket.ident] = OrderedDict()
+
+        self.expire(windows, window_start - bucket.secs)
 
-        self.ratelimits[key].setdefault(bucket.ident, {
-            'remaining': bucket.limit,
-            'reset': window_start + bucket.secs,
-            'window_start': window_start,
-        })
+        window = windows.get(key)
+        if window is None:
+            if len(windows) >= self.max_keys:
+                windows.popitem(last=False)
 
-        bucket_data = self.ratelimits[key][bucket.ident]
+            window = windows[key] = Window(window_start)
+        elif window.start != window_start:
+            # Fenêtre terminée : elle est remplacée, passe en fin de file, et ne compte
+            # plus qu'en partie si elle précède directement la nouvelle fenêtre
+            previous = window.used + window.pending if window.start == window_start - bucket.secs else 0
+            window = windows[key] = Window(window_start, previous)
+            windows.move_to_end(key)
 
-        if current_time >= bucket_data['reset']:
-            bucket_data['remaining'] = bucket.limit
-            bucket_data['reset'] = window_start + bucket.secs
-            bucket_data['window_start'] = window_start
+        weighted = int(window.previous * weight)
 
-        bucket_data['remaining'] -= 1
+        if not self.redis or window.used + weighted >= bucket.limit:
+            # Sans Redis, ou limite déjà atteinte d'après Redis : rien de plus à synchroniser
+            window.pending += 1
+        elif window.pending < self.batch_size and window.used + window.pending + weighted < bucket.limit * self.local_share:
+            # Loin de la limite : la requête est acceptée localement et envoyée plus tard
+            window.pending += 1
+            self.schedule_flush(key, bucket, window)
+        else:
+            # Proche de la limite, ou lot complet : la requête est comptée directement par Redis
+            increment = window.pending + 1
+            window.pending = 0
+
+            try:
+                (count, previous), = await self.increment([(key, bucket, window, increment)])
+                window.used = count
+                window.previous = max(window.previous, previous)
+            except RedisError as e:
+                print(f"Impossible de vérifier la limite de requêtes dans Redis : {e}")
+                window.pending += increment
+
+        used = window.used + window.pending + int(window.previous * weight)
+        remaining = bucket.limit - used
+        reset = window.start + bucket.secs
 
         headers = {
             'X-RateLimit-Limit': bucket.limit,
-            'X-RateLimit-Remaining': max(bucket_data['remaining'], 0),
-            'X-RateLimit-Reset': bucket_data['reset'] - current_time,  # Time remaining to reset
+            'X-RateLimit-Remaining': max(remaining, 0),
+            'X-RateLimit-Reset': reset - current_time,  # Time remaining to reset
             'X-RateLimit-Bucket': bucket.ident,
-            'X-RateLimit-Used': bucket.limit - bucket_data['remaining'],
+            'X-RateLimit-Used': used,
             'X-RateLimit-Key': key,
         }
 
-        if bucket_data['remaining'] < 0:
-            headers.update({'Retry-After': bucket_data['reset'] - current_time})
+        if remaining < 0:
+            cooldown = self.retry_after(window, bucket, now)
+
+            headers.update({'Retry-After': cooldown})
             raise RatelimitException(
                 headers=headers,
-                extra={'cooldown': bucket_data['reset'] - current_time}
+                extra={'cooldown': cooldown}
             )
 
         return headers
 
 
-    async def cleanup(self) -> None:
+    @staticmethod
+    def retry_after(window: Window, bucket: Bucket, now: float) -> int:
+        """
+        Calcule le délai avant que la fenêtre glissante n'accepte une nouvelle requête
+
+        :param window: Fenêtre courante de la clé
+        :param bucket: Bucket de rate limiting
+        :param now: Date de la requête (timestamp)
+        :return: Délai en secondes
+        """
+        current = window.used + window.pending
+
+        if current < bucket.limit:
+            # La fenêtre précédente doit encore glisser jusqu'à laisser de la place
+            at = window.start + bucket.secs * (1 - (bucket.limit - current) / window.previous)
+        else:
+            # Il faut attendre la fenêtre suivante, où la fenêtre courante ne comptera plus qu'en partie
+            at = window.start + bucket.secs * (2 - bucket.limit / current)
+
+        return max(math.ceil(at - now), 1)
+
+
+    def schedule_flush(self, key: str, bucket: Bucket, window: Window) -> None:
+        """
+        Planifie l'envoi à Redis des requêtes acceptées localement
+
+        :param key: Clé de la requête
+        :param bucket: Bucket de rate limiting
+        :param window: Fenêtre de la requête
+        """
+        self.dirty[window] = (key, bucket)
+
+        if self.flushing is None or self.flushing.done():
+            self.flushing = asyncio.ensure_future(self.flush_later())
+
+
+    async def flush_later(self) -> None:
         """
-        Nettoie les rate limits expirées afin de libérer de la mémoire
+        Envoie les requêtes acceptées localement à Redis après RATELIMIT_FLUSH_INTERVAL
         """
-        current_time = int(time.time())
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+
+    async def flush(self) -> None:
+        """
+        Envoie à Redis, en un seul lot, les requêtes acceptées localement
+        """
+        dirty, self.dirty = self.dirty, {}
+
+        # Les fenêtres remplacées depuis sont aussi envoyées : elles comptent encore
+        # comme fenêtre précédente
+        windows = []
+        for window, (key, bucket) in dirty.items():
+            if window.pending:
+                windows.append((key, bucket, window, window.pending))
+                window.pending = 0
 
-        if current_time - self.last_ratelimit_cleanup < 60:
+        if not windows or not self.redis:
             return
 
-        for key, buckets in self.ratelimits.items():
-            for bucket, data in list(buckets.items()):
-                if data['reset'] < current_time:
-                    del self.ratelimits[key][bucket]
+        try:
+            counts = await self.increment(windows)
+        except RedisError as e:
+            print(f"Impossible d'envoyer les requêtes comptées à Redis : {e}")
+
+            # Les requêtes restent comptées localement
+            for _, _, window, increment in windows:
+                window.pending += increment
+            return
+
+        for (_, _, window, _), (count, previous) in zip(windows, counts):
+            # Les requêtes arrivées pendant l'envoi restent dans window.pending
+            window.used = max(window.used, count)
+            window.previous = max(window.previous, previous)
+
+
+    def expire(self, windows: OrderedDict[str, Window], window_start: int) -> None:
+        """
+        Retire les fenêtres qui ne comptent plus en début de file, au plus EXPIRE_BATCH à la fois
+
+        :param windows: Fenêtres d'un bucket, de la plus ancienne à la plus récente
+        :param window_start: Début de la plus ancienne fenêtre encore comptée
+        """
+        for _ in range(self.EXPIRE_BATCH):
+            if not windows:
+                return
+
+            key = next(iter(windows))
+            if windows[key].start >= window_start:
+                return
 
-        self.last_ratelimit_cleanup = current_time
+            del windows[key]
 
 
 def ratelimit():
@@ -1,5 +1,6 @@
 from sanic.request import Request
-from sanic.response import JSONResponse, HTTPResponse, json, raw
+from sanic.response import JSONResponse, HTTPResponse, ResponseStream, json, raw
+from typing import Iterable
 
 
 class Response:
@@ -82,7 +83,7 @@ class Raw(Response):
         self,
         request: Request,
         success: bool = True,
-        data: str = None,
+        data: str | bytes = None,
         status: int = 200,
         content_type: str = "text/plain",
     ) -> None:
@@ -90,7 +91,7 @@ class Raw(Response):
         Initialisation de la classe
 
         :param request: Request
-        :param data: str
+        :param data: str | bytes
         :param success: bool
         :param status: int
         :param content_type: str
@@ -108,3 +109,60 @@ class Raw(Response):
         :return: HTTPResponse
         """
         return raw(body=self.data, status=self.status, content_type=self.content_type)
+
+
+class Stream(Response):
+    """
+    Classe pour les réponses envoyées par morceaux, au fur et à mesure de leur génération
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        chunks: Iterable[str | bytes],
+        status: int = 200,
+        content_type: str = "text/plain",
+        buffer_size: int = 64 * 1024,
+    ) -> None:
+        """
+        Initialisation de la classe
+
+        :param request: Request
+        :param chunks: Iterable[str | bytes]
+        :param status: int
+        :param content_type: str
+        :param buffer_size: Taille minimale des morceaux envoyés au client en octets
+        """
+        super().__init__(request)
+        self.chunks = chunks
+        self.status = status
+        self.content_type = content_type
+        self.buffer_size = buffer_size
+
+    def generate(self) -> ResponseStream:
+        """
+        Génère la réponse
+
+        :return: ResponseStream
+        """
+        async def streaming_fn(response: ResponseStream) -> None:
+            buffer = bytearray()
+            size = 0
+
+            for chunk in self.chunks:
+                buffer += chunk.encode() if isinstance(chunk, str) else chunk
+
+                if len(buffer) >= self.buffer_size:
+                    size += len(buffer)
+                    await response.write(bytes(buffer))
+                    buffer.clear()
+
+            if buffer:
+                size += len(buffer)
+                await response.write(bytes(buffer))
+
+            if self.request is not None:
+                statistics = self.request.app.ctx.statistics
+                statistics.response_bytes.labels(endpoint=statistics.endpoint(self.request)).observe(size)
+
+        return ResponseStream(streaming_fn, status=self.status, content_type=self.content_type)
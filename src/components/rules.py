@@ -67,11 +67,11 @@ class Rules:
     @staticmethod
     def date(arg: str) -> bool:
         """
-        Une date est une chaîne de caractères au format DD-MM-YYYY.
+        Une date est une chaîne de caractères au format DD-MM-YYYY, entre 1970 et 2100.
         """
         try:
-            datetime.strptime(arg, "%d-%m-%Y")
-            return True
+            # Au-delà, la conversion en timestamp à Paris dépasse les dates représentables
+            return 1970 <= datetime.strptime(arg, "%d-%m-%Y").year <= 2100
         except ValueError:
             return False
 
@@ -85,3 +85,20 @@ class Rules:
             return arg_str.startswith('g') and Rules.integer(arg_str[1:])
         except Exception:
             return False
+
+
+    @staticmethod
+    def groups(arg: list[str] | str) -> bool:
+        """
+        Une liste de groupes contient entre 1 et 10 groupes, chacun étant un 'g' suivi d'un entier positif.
+        """
+        values = arg if isinstance(arg, (list, tuple)) else [arg]
+        return 1 <= len(values) <= 10 and all(Rules.group(value) for value in values)
+
+
+    @staticmethod
+    def format(arg: str) -> bool:
+        """
+        Un format est une chaîne de caractères qui peut être soit "json" soit "msgpack".
+        """
+        return str(arg).lower() in ["json", "msgpack"]
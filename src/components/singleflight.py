@@ -0,0 +1,112 @@
+import asyncio
+
+from .budget import INTERACTIVE, priority
+from sanic import Sanic
+from redis.exceptions import LockError, RedisError
+from typing import Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Classe pour regrouper les appels concurrents identiques (single-flight)
+
+    Un seul appel est exécuté par clé, les autres appelants attendent et partagent son résultat.
+    Un verrou Redis étend ce regroupement à l'ensemble des workers Sanic.
+    """
+    def __init__(self, app: Sanic, lock_timeout: int = 60, result_ttl: int = 30) -> None:
+        """
+        Initialisation de la classe
+
+        :param app: Instance de l'application Sanic
+        :param lock_timeout: Durée maximale de détention du verrou Redis en secondes
+        :param result_ttl: Durée de conservation du résultat partagé entre les workers en secondes
+        """
+        self.app = app
+        self.lock_timeout = lock_timeout
+        self.result_ttl = result_ttl
+
+        self.calls: dict[str, asyncio.Task] = {}
+
+
+    async def do(self, key: str, func: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Exécute la fonction une seule fois pour tous les appels concurrents partageant la même clé
+
+        :param key: Clé identifiant l'appel (ex: agenda:g30029)
+        :param func: Fonction asynchrone à exécuter, retournant des données binaires
+        :return: Résultat de la fonction
+        """
+        task = self.calls.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, func))
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        elif priority.get() == INTERACTIVE and hasattr(self.app.ctx, "budget"):
+            # L'appel partagé a pu être lancé en arrière-plan (préchargement, régénération du cache) :
+            # un utilisateur attend désormais son résultat
+            self.app.ctx.budget.promote(task)
+
+        # Si un appelant est annulé (client déconnecté), l'appel partagé continue pour les autres
+        return await asyncio.shield(task)
+
+
+    async def _run(self, key: str, func: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Exécute la fonction sous un verrou Redis partagé entre les workers
+
+        :param key: Clé identifiant l'appel
+        :param func: Fonction asynchrone à exécuter
+        :return: Résultat de la fonction
+        """
+        cache = getattr(self.app.ctx, "cache", None)
+        if not cache or not cache.redis:
+            return await func()
+
+        lock = cache.redis.lock(
+            f"singleflight:lock:{key}",
+            timeout=self.lock_timeout,
+            blocking_timeout=self.lock_timeout,
+        )
+        result_key = f"singleflight:result:{key}"
+
+        try:
+            leader = await lock.acquire(blocking=False)
+
+            if not leader:
+                # Un autre worker effectue déjà l'appel, on attend qu'il libère le verrou
+                leader = await lock.acquire(blocking=True)
+
+                result = await cache.redis.get(result_key)
+                if result is not None:
+                    if leader:
+                        await self._release(lock)
+                    return result
+        except RedisError as e:
+            print(f"Impossible d'obtenir le verrou pour {key} : {e}")
+            return await func()
+
+        try:
+            result = await func()
+
+            try:
+                await cache.redis.setex(result_key, self.result_ttl, result)
+            except RedisError as e:
+                print(f"Impossible de partager le résultat pour {key} : {e}")
+
+            return result
+        finally:
+            if leader:
+                await self._release(lock)
+
+
+    async def _release(self, lock) -> None:
+        """
+        Libère un verrou Redis en ignorant les verrous déjà expirés
+
+        :param lock: Verrou Redis
+        """
+        try:
+            await lock.release()
+        except (LockError, RedisError):
+            pass
@@ -1,26 +1,55 @@
 import prometheus_client as prometheus
+import asyncio
+import glob
+import os
 
-from prometheus_client import CollectorRegistry
+from prometheus_client import CollectorRegistry, multiprocess
+from prometheus_client.mmap_dict import MmapedDict
 from sanic import Sanic, Request, response, HTTPResponse
+from sanic.response import ResponseStream
 from sanic_ext import openapi
 from datetime import datetime
 from os import environ
 from dotenv import load_dotenv
+from typing import Callable
 
 
 load_dotenv(dotenv_path=".env")
 
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
 class PrometheusStatistics:
     """
     Classe pour les statistiques Prometheus
     """
+    # Intervalle de mise à jour des jauges calculées en mode multiprocessus, en secondes
+    REFRESH_INTERVAL = 5
+
     def __init__(self, app: Sanic) -> None:
         """
         Initialisation de la classe
         
         :param app: Sanic
         """
+        self.app = app
+
+        # Avec plusieurs workers, chaque worker écrit ses métriques dans PROMETHEUS_MULTIPROC_DIR
+        # et /metrics les agrège, quel que soit le worker qui répond
+        self.multiprocess_dir = environ.get("PROMETHEUS_MULTIPROC_DIR")
+        if self.multiprocess_dir:
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+
+            # prometheus_client choisit ce mode à son import, avant le chargement du .env
+            prometheus.values.ValueClass = prometheus.values.MultiProcessValue()
+
+        # Jauges calculées à la demande, avec leur fonction
+        self.tracked: list[tuple[prometheus.Gauge, Callable[[], float]]] = []
+
         self.registry = CollectorRegistry()
 
         # Initialisation des métriques Prometheus
@@ -36,6 +65,136 @@ class PrometheusStatistics:
             labelnames=["method", "endpoint", "status"],
             registry=self.registry
         )
+        self.response_bytes = prometheus.Histogram(
+            name="reverseurcacelcat_response_bytes",
+            documentation="Size of response bodies in bytes, as sent (cached responses may be compressed)",
+            labelnames=["endpoint"],
+            buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+            registry=self.registry
+        )
+        self.cache_requests = prometheus.Counter(
+            name="reverseurcacelcat_cache_requests_total",
+            documentation="Cached routes responses by cache status (hit, stale, miss)",
+            labelnames=["endpoint", "status"],
+            registry=self.registry
+        )
+        self.cache_lookups = prometheus.Counter(
+            name="reverseurcacelcat_cache_lookups_total",
+            documentation="Cache lookups by tier (l1: memory, l2: Redis, miss)",
+            labelnames=["tier"],
+            registry=self.registry
+        )
+        self.cache_memory_bytes = prometheus.Gauge(
+            name="reverseurcacelcat_cache_memory_bytes",
+            documentation="Size of the in-memory cache in bytes",
+            multiprocess_mode="livesum",
+            registry=self.registry
+        )
+        self.track(
+            self.cache_memory_bytes,
+            lambda: app.ctx.cache.memory.size if hasattr(app.ctx, "cache") else 0
+        )
+        self.conversion_duration = prometheus.Histogram(
+            name="reverseurcacelcat_conversion_duration",
+            documentation="Duration of calendar parsing (inline or in the pool) and ICS rendering",
+            labelnames=["mode"],
+            registry=self.registry
+        )
+        self.conversion_queue = prometheus.Gauge(
+            name="reverseurcacelcat_conversion_queue",
+            documentation="Calendars waiting for or being parsed in the conversion pool",
+            multiprocess_mode="livesum",
+            registry=self.registry
+        )
+        self.track(
+            self.conversion_queue,
+            lambda: app.ctx.converter.pending if hasattr(app.ctx, "converter") else 0
+        )
+
+        self.upstream_duration = prometheus.Histogram(
+            name="reverseurcacelcat_upstream_duration",
+            documentation="Duration of agenda requests to CELCAT by outcome (ok, not_modified, not_found, expired, error)",
+            labelnames=["status"],
+            buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+            registry=self.registry
+        )
+        self.cas_login_duration = prometheus.Histogram(
+            name="reverseurcacelcat_cas_login_duration",
+            documentation="Duration of CAS logins by result (success, failure)",
+            labelnames=["result"],
+            buckets=(0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+            registry=self.registry
+        )
+        self.agenda_events = prometheus.Histogram(
+            name="reverseurcacelcat_agenda_events",
+            documentation="Number of events in agendas downloaded from CELCAT",
+            buckets=(0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+            registry=self.registry
+        )
+        self.upstream_connections = prometheus.Counter(
+            name="reverseurcacelcat_upstream_connections_total",
+            documentation="Connections used for requests to CELCAT and CAS (created: new connection, reused: keep-alive)",
+            labelnames=["state"],
+            registry=self.registry
+        )
+        self.breaker_state = prometheus.Gauge(
+            name="reverseurcacelcat_breaker_state",
+            documentation="State of the CELCAT circuit breaker (0: closed, 1: half-open, 2: open)",
+            multiprocess_mode="livemax",
+            registry=self.registry
+        )
+        self.track(
+            self.breaker_state,
+            lambda: {"closed": 0, "half_open": 1, "open": 2}[app.ctx.breaker.state] if hasattr(app.ctx, "breaker") else 0
+        )
+        self.breaker_rejections = prometheus.Counter(
+            name="reverseurcacelcat_breaker_rejections_total",
+            documentation="Calls to CELCAT rejected by the circuit breaker",
+            registry=self.registry
+        )
+        self.outbound_queue = prometheus.Gauge(
+            name="reverseurcacelcat_outbound_queue",
+            documentation="Requests to CELCAT waiting for a token of the outbound budget",
+            multiprocess_mode="livesum",
+            registry=self.registry
+        )
+        self.track(
+            self.outbound_queue,
+            lambda: len(app.ctx.budget.queue) if hasattr(app.ctx, "budget") else 0
+        )
+        self.outbound_rejections = prometheus.Counter(
+            name="reverseurcacelcat_outbound_rejections_total",
+            documentation="Requests to CELCAT abandoned after waiting too long for a token",
+            labelnames=["priority"],
+            registry=self.registry
+        )
+
+        if self.multiprocess_dir:
+            @app.main_process_start
+            async def clear_metrics(app, _):
+                """
+                Supprime les métriques d'une exécution précédente avant le démarrage des workers
+                """
+                for filename in glob.glob(os.path.join(self.multiprocess_dir, "*.db")):
+                    os.remove(filename)
+
+
+            @app.before_server_start
+            async def setup_metrics(app, _):
+                """
+                Regroupe les métriques des workers arrêtés et lance la mise à jour des jauges
+                """
+                self.compact()
+                app.add_task(self.refresh(), name="metrics_refresh")
+
+
+            @app.after_server_stop
+            async def close_metrics(app, _):
+                """
+                Retire les jauges de ce worker des métriques agrégées
+                """
+                multiprocess.mark_process_dead(os.getpid(), self.multiprocess_dir)
+
 
         # Middlewares pour suivre les requêtes
         @app.middleware("request")
@@ -51,18 +210,24 @@ class PrometheusStatistics:
             """
             Middleware pour suivre les réponses
             """
+            endpoint = self.endpoint(request)
+
             self.requests.labels(
                 method=request.method,
-                endpoint=request.path,
+                endpoint=endpoint,
                 status=response.status
             ).inc()
 
             self.requests_duration.labels(
                 method=request.method,
-                endpoint=request.path,
+                endpoint=endpoint,
                 status=response.status
             ).observe(datetime.now().timestamp() - request.ctx.process_time)
 
+            # La taille des réponses envoyées par morceaux est mesurée à la fin de l'envoi
+            if not isinstance(response, ResponseStream) and response.body is not None:
+                self.response_bytes.labels(endpoint=endpoint).observe(len(response.body))
+
 
         @app.route("/metrics", methods=["GET"])
         @openapi.no_autodoc
@@ -84,9 +249,120 @@ class PrometheusStatistics:
                     status=401
                 )
 
-            output = prometheus.exposition.generate_latest(self.registry).decode("utf-8")
+            if self.multiprocess_dir:
+                # Métriques de tous les workers, lues depuis leurs fichiers
+                registry = CollectorRegistry()
+                multiprocess.MultiProcessCollector(registry, path=self.multiprocess_dir)
+            else:
+                registry = self.registry
+
+            output = prometheus.exposition.generate_latest(registry).decode("utf-8")
             content_type = prometheus.exposition.CONTENT_TYPE_LATEST
             return response.text(
                 body=output,        
                 content_type=content_type
             )
+
+
+    def track(self, gauge: prometheus.Gauge, function: Callable[[], float]) -> None:
+        """
+        Calcule la valeur d'une jauge avec une fonction
+
+        Sans plusieurs workers, la fonction est appelée à chaque lecture des métriques. En
+        mode multiprocessus, seules les valeurs écrites dans les fichiers sont agrégées :
+        la jauge est alors mise à jour toutes les REFRESH_INTERVAL secondes.
+
+        :param gauge: Jauge
+        :param function: Fonction retournant la valeur de la jauge
+        """
+        if self.multiprocess_dir:
+            self.tracked.append((gauge, function))
+        else:
+            gauge.set_function(function)
+
+
+    async def refresh(self) -> None:
+        """
+        Met à jour en arrière-plan les jauges calculées de ce worker (mode multiprocessus)
+        """
+        while True:
+            for gauge, function in self.tracked:
+                try:
+                    gauge.set(function())
+                except Exception as e:
+                    print(f"Impossible de mettre à jour une jauge : {e}")
+
+            await asyncio.sleep(self.REFRESH_INTERVAL)
+
+
+    def compact(self) -> None:
+        """
+        Regroupe les fichiers de métriques des workers arrêtés
+
+        Les compteurs, histogrammes et résumés d'un worker arrêté sont ajoutés à un fichier
+        d'archive par type, et les jauges des workers arrêtés sont supprimées : le nombre
+        de fichiers lus à chaque requête sur /metrics dépend des workers en cours
+        d'exécution, et non de tous les workers lancés depuis le démarrage.
+        """
+        if fcntl is None:
+            return
+
+        with open(os.path.join(self.multiprocess_dir, "compact.lock"), "w") as lock:
+            # Un seul worker à la fois, plusieurs pouvant démarrer en même temps
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            archives: dict[str, MmapedDict] = {}
+
+            try:
+                for filename in glob.glob(os.path.join(self.multiprocess_dir, "*.db")):
+                    kind, _, pid = os.path.basename(filename)[:-3].rpartition("_")
+
+                    if not pid.isdigit() or self.alive(int(pid)):
+                        continue
+
+                    if kind in ("counter", "histogram", "summary"):
+                        archive = archives.get(kind)
+                        if archive is None:
+                            archive = archives[kind] = MmapedDict(os.path.join(self.multiprocess_dir, f"{kind}_archive.db"))
+
+                        for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(filename):
+                            archive.write_value(key, archive.read_value(key)[0] + value, timestamp)
+
+                        os.remove(filename)
+                    elif kind.startswith("gauge_live"):
+                        os.remove(filename)
+            finally:
+                for archive in archives.values():
+                    archive.close()
+
+
+    @staticmethod
+    def alive(pid: int) -> bool:
+        """
+        Vérifie si un processus est en cours d'exécution
+
+        :param pid: PID du processus
+        :return: Vrai si le processus existe
+        """
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+
+        return True
+
+
+    @staticmethod
+    def endpoint(request: Request) -> str:
+        """
+        Nom de la route correspondant à la requête, utilisé comme label
+
+        Le nom de la route (et non le chemin) limite le nombre de séries : un agenda par
+        groupe ne crée pas une série par groupe, et les chemins inconnus sont regroupés.
+
+        :param request: Request
+        :return: Nom de la route, ou "unmatched"
+        """
+        return request.route.name if request.route else "unmatched"
@@ -18,3 +18,58 @@ class AppConfig(Config):
     CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 
     FALLBACK_ERROR_FORMAT = "json"
+
+    # Préchargement des agendas les plus demandés
+    PREFETCH_ENABLED = True
+    PREFETCH_INTERVAL = 60  # secondes entre deux cycles
+    PREFETCH_TOP = 200  # nombre maximum de groupes préchargés
+    PREFETCH_MIN_REQUESTS = 5  # requêtes minimum sur les deux dernières heures
+    PREFETCH_LEAD = 5 * 60  # préchargement lorsque le cache expire dans moins de 5 minutes
+    PREFETCH_CONCURRENCY = 4  # requêtes simultanées maximum vers CELCAT
+
+    # Cache en mémoire (L1) devant Redis, sur chaque worker
+    CACHE_MEMORY_SIZE = 64 * 1024 * 1024  # octets (0 pour le désactiver)
+    CACHE_MEMORY_MAX_AGE = 60  # secondes, limite l'incohérence en cas d'invalidation manquée
+
+    # Conversion des agendas XML en iCalendar
+    CONVERTER_WORKERS = 2  # processus de conversion par worker (0 pour tout analyser directement)
+    CONVERTER_INLINE_THRESHOLD = 256 * 1024  # octets de XML en dessous desquels l'analyse reste directe
+
+    # Agendas fusionnés de plusieurs groupes
+    AGENDA_MERGE_CONCURRENCY = 4  # téléchargements simultanés des agendas d'une même requête
+
+    # Sessions CELCAT connectées en parallèle
+    CLIENT_POOL_SIZE = 2  # sessions par worker
+    CLIENT_POOL_MAX_FAILURES = 3  # échecs consécutifs avant de reconnecter une session
+    CLIENT_ROTATION_INTERVAL = 0  # âge en secondes à partir duquel une session est renouvelée (0 : uniquement lorsque CELCAT la refuse)
+
+    # Connexions HTTP vers CELCAT et le CAS, partagées par les sessions d'un worker
+    UPSTREAM_CONNECTIONS = 32  # connexions simultanées maximum
+    UPSTREAM_CONNECTIONS_PER_HOST = 16  # connexions simultanées maximum par hôte
+    UPSTREAM_KEEPALIVE = 30  # secondes de conservation d'une connexion inutilisée
+    UPSTREAM_DNS_TTL = 300  # secondes de mise en cache des résolutions DNS
+    UPSTREAM_TIMEOUT = 60  # durée maximale d'une requête en secondes
+    UPSTREAM_CONNECT_TIMEOUT = 5  # durée maximale d'obtention d'une connexion en secondes
+    UPSTREAM_READ_TIMEOUT = 30  # durée maximale entre deux lectures de la réponse en secondes
+    UPSTREAM_RETRIES = 2  # nouveaux essais d'une requête GET en échec
+    UPSTREAM_RETRY_BACKOFF = 0.5  # délai de base entre deux essais en secondes, doublé à chaque essai
+    UPSTREAM_RETRY_BACKOFF_MAX = 5  # délai maximum entre deux essais en secondes
+
+    # Disjoncteur devant CELCAT, sur chaque worker
+    BREAKER_WINDOW = 60  # durée de la fenêtre glissante des appels suivis en secondes
+    BREAKER_MIN_CALLS = 10  # appels minimum dans la fenêtre avant de pouvoir ouvrir le disjoncteur
+    BREAKER_ERROR_RATE = 0.5  # taux d'échec à partir duquel le disjoncteur s'ouvre
+    BREAKER_SLOW_CALL = 20  # durée en secondes à partir de laquelle un appel compte comme un échec
+    BREAKER_OPEN_DURATION = 30  # secondes pendant lesquelles les appels sont refusés avant un essai
+
+    # Limitation du nombre de requêtes, partagée entre les workers via Redis
+    RATELIMIT_FLUSH_INTERVAL = 0.5  # secondes entre deux envois à Redis des requêtes comptées localement
+    RATELIMIT_LOCAL_SHARE = 0.5  # part de la limite en dessous de laquelle les requêtes sont comptées localement
+    RATELIMIT_BATCH_SIZE = 10  # requêtes comptées localement au maximum avant un envoi à Redis
+    RATELIMIT_MAX_KEYS = 100_000  # clés (adresses IP) suivies au maximum par worker et par bucket
+
+    # Débit des requêtes vers CELCAT, partagé entre les workers et les serveurs via Redis
+    OUTBOUND_RATE = 5  # requêtes par seconde vers CELCAT (0 pour ne pas limiter)
+    OUTBOUND_BURST = 10  # requêtes pouvant partir d'un coup après une période calme
+    OUTBOUND_MAX_WAIT = 10  # attente maximale d'une requête d'un utilisateur en secondes
+    OUTBOUND_BACKGROUND_MAX_WAIT = 60  # attente maximale d'un rafraîchissement en arrière-plan en secondes
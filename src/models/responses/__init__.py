@@ -1,6 +1,8 @@
 from .status import Status
+from .events import Events
 
 
 __all__ = [
     "Status",
+    "Events",
 ]
@@ -0,0 +1,65 @@
+from sanic_ext import openapi
+
+
+class Event:
+    id = openapi.String(
+        description="ID de l'événement CELCAT",
+        example="1234567",
+    )
+    start = openapi.Integer(
+        description="Début de l'événement (timestamp en secondes)",
+        example=1771246800,
+    )
+    end = openapi.Integer(
+        description="Fin de l'événement (timestamp en secondes)",
+        example=1771254000,
+    )
+    module = openapi.String(
+        description="Module",
+        example="R4.10 - Développement web",
+        nullable=True,
+    )
+    category = openapi.String(
+        description="Type de cours (CM, TD, TP, ...)",
+        example="TD",
+        nullable=True,
+    )
+    room = openapi.String(
+        description="Salle",
+        example="Salle 21 - Bâtiment B",
+        nullable=True,
+    )
+    group = openapi.String(
+        description="Groupe",
+        example="S3 - Groupe B",
+        nullable=True,
+    )
+    notes = openapi.String(
+        description="Remarques",
+        example="Apporter un ordinateur",
+        nullable=True,
+    )
+    prettytimes = openapi.String(
+        description="Horaires, tels qu'affichés par CELCAT",
+        example="14:00-16:00 TD",
+        nullable=True,
+    )
+
+
+class EventsData:
+    group = openapi.String(
+        description="ID du groupe",
+        example="g30029",
+    )
+    events = openapi.Array(
+        Event,
+        description="Événements de l'agenda",
+    )
+
+
+class Events:
+    success = openapi.Boolean(
+        description="Statut de la requête",
+        example=True,
+    )
+    data = EventsData
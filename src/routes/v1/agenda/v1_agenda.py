@@ -1,11 +1,15 @@
-from ....client import UnknownAgenda, UnknownError
+import msgpack
+
+from ....client import UnknownError
 from ....components.ratelimit import ratelimit
 from ....components.cache import cache
-from ....components.response import JSON, Raw
-from ....components.argument import Argument, inputs
+from ....components.response import JSON, Raw, Stream
+from ....components.argument import Argument, date_range, inputs, valid_date_range
 from ....components.rules import Rules
-from ....utils.xml_to_ics import convert_xml_to_ics
-from sanic.response import JSONResponse
+from ....components.prefetch import popular
+from ....models.responses import Events
+from ....utils.agenda import fetch_events, fetch_merged_events, CACHE_TTL, CACHE_STALE, CACHE_JITTER, STALE_WARNING
+from sanic.response import HTTPResponse, JSONResponse
 from sanic import Blueprint, Request
 from sanic_ext import openapi
 
@@ -22,7 +26,7 @@ bp = Blueprint(
 @bp.route("/agenda/<group>", methods=["GET"])
 @openapi.definition(
     summary="Obtenir l'agenda d'un groupe",
-    description="Retourne l'agenda d'un groupe au format iCalendar (ICS) pour une intégration facile dans des applications tierces comme Google Agenda, Outlook, etc.\n\nPour obtenir l'ID d'un groupe vous devez vous connecter à l'interface CELCAT de votre établissement, aller dans la section des emplois du temps, sélectionner le groupe souhaité, puis copier l'ID du groupe depuis l'URL.\n\nPour des raisons de sécurité et de confidentialité, l'API ne révèle pas si un groupe existe ou non. Si le groupe n'existe pas, un agenda vide sera retourné.",
+    description="Retourne l'agenda d'un groupe au format iCalendar (ICS) pour une intégration facile dans des applications tierces comme Google Agenda, Outlook, etc.\n\nPour obtenir l'ID d'un groupe vous devez vous connecter à l'interface CELCAT de votre établissement, aller dans la section des emplois du temps, sélectionner le groupe souhaité, puis copier l'ID du groupe depuis l'URL.\n\nPour des raisons de sécurité et de confidentialité, l'API ne révèle pas si un groupe existe ou non. Si le groupe n'existe pas, un agenda vide sera retourné.\n\nLes paramètres `start` et `end` (DD-MM-YYYY) permettent de ne retourner que les événements commençant dans une période.\n\nSi CELCAT est indisponible, la dernière version connue de l'agenda est retournée avec un en-tête `Warning`.",
     tag="Agenda"
 )
 @inputs(
@@ -37,32 +41,120 @@ bp = Blueprint(
         headers=False,
         allow_multiple=False,
         deprecated=False,
-    )
+    ),
+    *date_range()
 )
+@valid_date_range
 @ratelimit()
+@popular(
+    argument="group",
+)
 @cache(
-    ttl=60 * 60,  # 1 heure,
+    ttl=CACHE_TTL,
+    stale=CACHE_STALE,
+    jitter=CACHE_JITTER,
 )
-async def getAgenda(request: Request, group: str) -> JSONResponse:
+async def getAgenda(request: Request, group: str, start: int | None, end: int | None) -> JSONResponse:
     """
     Retourne les statistiques de l'API.
 
     :return: JSONResponse
     """
     try:
-        agenda = await request.app.ctx.client.agenda(
-            group_id=group,
+        calendar = await fetch_events(
+            app=request.app,
+            group=group,
+        )
+    except UnknownError:
+        return JSON(
+            request=request,
+            success=False,
+            message="Une erreur inconnue est survenue lors de la récupération de l'agenda !",
+            status=500
+        ).generate()
+
+    events = calendar if start is None and end is None else calendar.between(start, end)
+
+    # L'agenda est converti et envoyé événement par événement
+    response = Stream(
+        request=request,
+        chunks=request.app.ctx.converter.render(events),
+        status=200,
+        content_type="text/calendar",
+    ).generate()
+
+    # Les validateurs doivent être envoyés avant le corps : ils sont tirés de l'empreinte des événements
+    etag = calendar.etag(start, end)
+    if etag:
+        response.headers["ETag"] = etag
+
+    if calendar.stale:
+        # CELCAT est indisponible : dernière version connue de l'agenda
+        response.headers["Warning"] = STALE_WARNING
+
+    return response
+
+
+# /agenda/<group>/events
+@bp.route("/agenda/<group>/events", methods=["GET"])
+@openapi.definition(
+    summary="Obtenir les événements de l'agenda d'un groupe",
+    description="Retourne les événements de l'agenda d'un groupe sous forme structurée, pour une utilisation directe par d'autres services sans passer par le format iCalendar.\n\nLes événements sont retournés en JSON par défaut, ou en MessagePack avec `format=msgpack`. Les dates sont des timestamps en secondes. Les paramètres `start` et `end` (DD-MM-YYYY) permettent de ne retourner que les événements commençant dans une période.\n\nComme pour l'agenda iCalendar, si le groupe n'existe pas, une liste vide sera retournée, et si CELCAT est indisponible, la dernière version connue est retournée avec un en-tête `Warning`.",
+    tag="Agenda"
+)
+@openapi.response(
+    status=200,
+    content={
+        "application/json": Events,
+        "application/msgpack": Events,
+    },
+    description="Les événements de l'agenda."
+)
+@inputs(
+    Argument(
+        name="group",
+        description="ID du groupe",
+        methods={
+            "group": Rules.group
+        },
+        call=str,
+        required=True,
+        headers=False,
+        allow_multiple=False,
+        deprecated=False,
+    ),
+    *date_range(),
+    Argument(
+        name="format",
+        description="Format de la réponse (json ou msgpack)",
+        methods={
+            "format": Rules.format
+        },
+        call=str.lower,
+        required=False,
+        headers=False,
+        allow_multiple=False,
+        deprecated=False,
+    )
+)
+@valid_date_range
+@ratelimit()
+@cache(
+    ttl=CACHE_TTL,
+    stale=CACHE_STALE,
+    jitter=CACHE_JITTER,
+)
+async def getAgendaEvents(request: Request, group: str, start: int | None, end: int | None, format: str | None) -> HTTPResponse:
+    """
+    Retourne les événements de l'agenda d'un groupe.
+
+    :return: HTTPResponse
+    """
+    try:
+        calendar = await fetch_events(
+            app=request.app,
+            group=group,
         )
-    except UnknownAgenda:
-        # return JSON(
-        #     request=request,
-        #     success=False,
-        #     message="Groupe inconnu !",
-        #     status=404
-        # ).generate()
-
-        # Pour éviter de révéler l'existence ou non d'un groupe, on retourne un agenda vide
-        agenda = "<calendar></calendar>"
     except UnknownError:
         return JSON(
             request=request,
@@ -71,12 +163,100 @@ async def getAgenda(request: Request, group: str) -> JSONResponse:
             status=500
         ).generate()
 
-    ics = await convert_xml_to_ics(agenda)
+    events = calendar if start is None and end is None else calendar.between(start, end)
+
+    data = {
+        "group": group,
+        "events": [event.to_dict() for event in events],
+    }
+
+    if format == "msgpack":
+        response = Raw(
+            request=request,
+            data=msgpack.packb({"success": True, "data": data}),
+            status=200,
+            content_type="application/msgpack",
+        ).generate()
+    else:
+        response = JSON(
+            request=request,
+            success=True,
+            data=data,
+            status=200
+        ).generate()
+
+    if calendar.stale:
+        # CELCAT est indisponible : dernière version connue de l'agenda
+        response.headers["Warning"] = STALE_WARNING
+
+    return response
+
 
-    return Raw(
+# /agenda
+@bp.route("/agenda", methods=["GET"])
+@openapi.definition(
+    summary="Obtenir l'agenda fusionné de plusieurs groupes",
+    description="Retourne, au format iCalendar (ICS), un seul agenda regroupant les événements de plusieurs groupes (par exemple un groupe de CM et ses groupes de TD et TP), pour s'abonner à un seul flux au lieu d'un par groupe.\n\nLes groupes sont passés en répétant le paramètre `group` (ex: `?group=g30029&group=g30030`), dans la limite de 10 groupes. Un événement commun à plusieurs groupes n'apparaît qu'une fois.\n\nLes paramètres `start` et `end` (DD-MM-YYYY) permettent de ne retourner que les événements commençant dans une période.\n\nSi CELCAT est indisponible, la dernière version connue de l'agenda est retournée avec un en-tête `Warning`.",
+    tag="Agenda"
+)
+@inputs(
+    Argument(
+        name="group",
+        description="ID des groupes",
+        methods={
+            "group": Rules.groups
+        },
+        call=list,
+        required=True,
+        headers=False,
+        allow_multiple=True,
+        deprecated=False,
+    ),
+    *date_range()
+)
+@valid_date_range
+@ratelimit()
+@cache(
+    ttl=CACHE_TTL,
+    stale=CACHE_STALE,
+    jitter=CACHE_JITTER,
+)
+async def getMergedAgenda(request: Request, group: list[str], start: int | None, end: int | None) -> HTTPResponse:
+    """
+    Retourne l'agenda fusionné de plusieurs groupes.
+
+    :return: HTTPResponse
+    """
+    try:
+        calendar = await fetch_merged_events(
+            app=request.app,
+            groups=group,
+        )
+    except UnknownError:
+        return JSON(
+            request=request,
+            success=False,
+            message="Une erreur inconnue est survenue lors de la récupération de l'agenda !",
+            status=500
+        ).generate()
+
+    events = calendar if start is None and end is None else calendar.between(start, end)
+
+    # L'agenda est converti et envoyé événement par événement
+    response = Stream(
         request=request,
-        success=True,
-        data=ics,
+        chunks=request.app.ctx.converter.render(events),
         status=200,
         content_type="text/calendar",
     ).generate()
+
+    # Les validateurs doivent être envoyés avant le corps : ils sont tirés de l'empreinte des événements
+    etag = calendar.etag(start, end)
+    if etag:
+        response.headers["ETag"] = etag
+
+    if calendar.stale:
+        # CELCAT est indisponible : dernière version connue de l'agenda
+        response.headers["Warning"] = STALE_WARNING
+
+    return response
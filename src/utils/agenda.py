@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import time
+
+from .events import Calendar
+from ..client import UnknownAgenda, UnknownError, NotModified
+from aiohttp import ClientError
+from redis.exceptions import RedisError
+from sanic import Sanic
+
+
+# Durées de mise en cache des agendas
+CACHE_TTL = 60 * 60  # 1 heure
+CACHE_STALE = 60 * 60 * 24  # 1 jour
+CACHE_JITTER = 0.1
+
+# Durée pendant laquelle les événements d'un groupe sont réutilisés sans interroger CELCAT
+EVENTS_TTL = 60 * 5  # 5 minutes
+
+# Durée de conservation de la dernière version connue d'un agenda et de ses validateurs CELCAT
+UPSTREAM_TTL = 60 * 60 * 24 * 7  # 7 jours
+
+# Durée pendant laquelle un worker réutilise la dernière version connue lorsque CELCAT est indisponible
+STALE_EVENTS_TTL = 30  # 30 secondes
+
+# En-tête Warning des réponses construites à partir de la dernière version connue
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+async def fetch_events(app: Sanic, group: str) -> Calendar:
+    """
+    Récupère les événements de l'agenda d'un groupe
+
+    Les appels concurrents pour un même groupe sont regroupés : un seul
+    téléchargement est effectué, puis partagé.
+
+    Les événements sont conservés sous forme compacte avec les validateurs CELCAT
+    (ETag, Last-Modified) : toutes les représentations d'un groupe (ICS, JSON, ...)
+    sont construites à partir d'un même téléchargement. Passé EVENTS_TTL, la requête
+    vers CELCAT est conditionnelle et, si l'agenda n'a pas changé, les événements
+    conservés sont réutilisés.
+
+    Chaque worker garde aussi l'agenda lu en mémoire (avec son index par semaine)
+    pendant au plus EVENTS_TTL, dans la limite de la taille du cache en mémoire.
+
+    Si CELCAT est indisponible (erreur, ou disjoncteur ouvert), la dernière version
+    connue, conservée pendant UPSTREAM_TTL, est retournée et marquée comme périmée.
+    Des événements conservés illisibles sont supprimés puis téléchargés à nouveau.
+
+    :param app: Instance de l'application Sanic
+    :type app: Sanic
+    :param group: ID du groupe (ex: g30029)
+    :type group: str
+    :return: L'agenda du groupe
+    :rtype: Calendar
+    :raises UnknownError: Si l'agenda ne peut pas être récupéré, ni sa dernière version connue
+    """
+    # Agenda déjà lu par ce worker, avec son index par semaine
+    memory = app.ctx.cache.memory
+    calendar = memory.get(f"agenda:events:{group}")
+    if calendar is not None:
+        return calendar
+
+    redis = app.ctx.cache.redis
+    # La version du format fait partie de la clé : un changement de format ignore les anciennes entrées
+    key = f"agenda:events:v{Calendar.VERSION}:{group}"
+
+    async def fetch() -> bytes:
+        stored = {}
+        if redis:
+            try:
+                stored = await redis.hgetall(key)
+            except RedisError as e:
+                print(f"Impossible de lire les derniers événements de l'agenda {group} : {e}")
+
+        if stored.get(b"events") and time.time() - float(stored.get(b"fetched", 0)) < EVENTS_TTL:
+            return stored[b"events"]
+
+        try:
+            if stored.get(b"events") and (stored.get(b"etag") or stored.get(b"last_modified")):
+                agenda = await app.ctx.clients.agenda(
+                    group_id=group,
+                    etag=stored.get(b"etag", b"").decode() or None,
+                    last_modified=stored.get(b"last_modified", b"").decode() or None,
+                )
+            else:
+                agenda = await app.ctx.clients.agenda(
+                    group_id=group,
+                )
+        except NotModified:
+            try:
+                async with redis.pipeline(transaction=True) as pipe:
+                    pipe.hset(key, "fetched", time.time())
+                    pipe.expire(key, UPSTREAM_TTL)
+                    await pipe.execute()
+            except RedisError:
+                pass
+
+            return stored[b"events"]
+        except UnknownAgenda:
+            # Pour éviter de révéler l'existence ou non d'un groupe, on retourne un agenda vide
+            return Calendar([]).dumps()
+
+        calendar = await app.ctx.converter.parse(agenda.xml)
+        app.ctx.statistics.agenda_events.observe(len(calendar))
+        events = calendar.dumps()
+
+        if redis:
+            try:
+                async with redis.pipeline(transaction=True) as pipe:
+                    pipe.hset(key, mapping={
+                        "events": events,
+                        "etag": agenda.etag or "",
+                        "last_modified": agenda.last_modified or "",
+                        "fetched": time.time(),
+                    })
+                    pipe.expire(key, UPSTREAM_TTL)
+                    await pipe.execute()
+            except RedisError as e:
+                print(f"Impossible de conserver les événements de l'agenda {group} : {e}")
+
+        return events
+
+    stale = False
+    try:
+        events = await app.ctx.singleflight.do(f"agenda:{group}", fetch)
+    except (UnknownError, ClientError, asyncio.TimeoutError) as e:
+        events = None
+        if redis:
+            try:
+                events = await redis.hget(key, "events")
+            except RedisError:
+                pass
+
+        if not events:
+            raise
+
+        print(f"CELCAT indisponible, dernière version connue de l'agenda {group} utilisée : {e}")
+        stale = True
+
+    try:
+        calendar = Calendar.loads(events)
+    except ValueError as e:
+        # Un agenda vide serait mis en cache comme une réponse normale : les événements sont téléchargés à nouveau
+        print(f"Événements de l'agenda {group} illisibles, nouveau téléchargement : {e}")
+
+        if redis:
+            try:
+                await redis.delete(key)
+            except RedisError:
+                pass
+
+        try:
+            events = await app.ctx.singleflight.do(f"agenda:{group}", fetch)
+            calendar = Calendar.loads(events)
+        except (UnknownError, ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise UnknownError(f"Impossible de récupérer les événements de l'agenda {group} : {e}") from e
+
+        stale = False
+
+    calendar.stale = stale
+    calendar.digest = hashlib.blake2b(events, digest_size=16).hexdigest()
+    memory.set(f"agenda:events:{group}", calendar, calendar.size, time.time() + (STALE_EVENTS_TTL if stale else EVENTS_TTL))
+    return calendar
+
+
+async def fetch_merged_events(app: Sanic, groups: list[str]) -> Calendar:
+    """
+    Récupère et fusionne les événements des agendas de plusieurs groupes
+
+    Les agendas sont récupérés en parallèle, dans la limite de AGENDA_MERGE_CONCURRENCY
+    téléchargements simultanés. Chaque agenda profite du cache de son groupe, et un
+    événement commun à plusieurs groupes (même ID CELCAT, même début) n'apparaît qu'une fois.
+
+    :param app: Instance de l'application Sanic
+    :type app: Sanic
+    :param groups: ID des groupes (ex: ["g30029", "g30030"])
+    :type groups: list[str]
+    :return: L'agenda fusionné
+    :rtype: Calendar
+    """
+    semaphore = asyncio.Semaphore(int(app.config.AGENDA_MERGE_CONCURRENCY))
+
+    async def fetch(group: str) -> Calendar:
+        async with semaphore:
+            return await fetch_events(app, group)
+
+    # Groupes triés : l'ordre des paramètres ne change ni la réponse, ni sa clé de cache
+    calendars = await asyncio.gather(*(fetch(group) for group in sorted(set(groups))))
+    return Calendar.merge(calendars)
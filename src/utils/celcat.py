@@ -0,0 +1,188 @@
+import xml.etree.ElementTree as ET
+import xml.parsers.expat
+
+from typing import Callable, Iterator
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+# Champs d'un événement CELCAT, lus directement sous <event>
+EVENT_FIELDS = frozenset({
+    "day", "starttime", "startTime", "endtime", "endTime", "notes", "prettytimes", "category",
+})
+
+# Ressources d'un événement CELCAT, lues sous <event><resources>
+RESOURCE_FIELDS = frozenset({"room", "group", "module"})
+
+
+def read_element(ev) -> dict[str, str | None]:
+    """
+    Lit les champs d'un élément <event> en un seul parcours de ses enfants
+
+    Seule la première occurrence de chaque champ est conservée, comme avec Element.find :
+    - "starttime", "notes", ... : texte du premier enfant direct portant ce nom
+    - "room", "group", "module" : texte de la première ressource de ce type
+    - "room/item", ... : texte du premier <item> d'une ressource de ce type
+
+    :param ev: Élément <event> (ElementTree ou lxml)
+    :return: Champs de l'événement, avec les attributs "id" et "date"
+    """
+    fields = {
+        "id": ev.get("id"),
+        "date": ev.get("date"),
+    }
+
+    for child in ev:
+        tag = child.tag
+
+        if tag == "resources":
+            for resource in child:
+                name = resource.tag
+
+                if name in RESOURCE_FIELDS:
+                    fields.setdefault(name, resource.text)
+
+                    if name + "/item" not in fields:
+                        for item in resource:
+                            if item.tag == "item":
+                                fields[name + "/item"] = item.text
+                                break
+        elif tag in EVENT_FIELDS:
+            fields.setdefault(tag, child.text)
+
+    return fields
+
+
+def iter_elementtree(xml_data: str | bytes, chunk_size: int) -> Iterator[dict[str, str | None]]:
+    """
+    Analyse le XML CELCAT avec ElementTree (bibliothèque standard)
+
+    :param xml_data: Données XML CELCAT
+    :param chunk_size: Taille des morceaux de XML transmis à l'analyseur
+    :return: Champs de chaque événement
+    """
+    parser = ET.XMLPullParser(events=("end",))
+
+    for offset in range(0, len(xml_data), chunk_size):
+        parser.feed(xml_data[offset:offset + chunk_size])
+
+        for _, ev in parser.read_events():
+            if ev.tag == "event":
+                yield read_element(ev)
+
+                # L'événement lu n'est plus utile, on libère ses éléments
+                ev.clear()
+
+    parser.close()
+
+
+def iter_lxml(xml_data: str | bytes, chunk_size: int) -> Iterator[dict[str, str | None]]:
+    """
+    Analyse le XML CELCAT avec lxml
+
+    :param xml_data: Données XML CELCAT
+    :param chunk_size: Taille des morceaux de XML transmis à l'analyseur
+    :return: Champs de chaque événement
+    """
+    if isinstance(xml_data, str):
+        # lxml refuse les chaînes portant une déclaration d'encodage, le texte est donc réencodé
+        xml_data = xml_data.encode()
+        parser = lxml_etree.XMLPullParser(events=("end",), tag="event", encoding="utf-8")
+    else:
+        parser = lxml_etree.XMLPullParser(events=("end",), tag="event")
+
+    for offset in range(0, len(xml_data), chunk_size):
+        parser.feed(xml_data[offset:offset + chunk_size])
+
+        for _, ev in parser.read_events():
+            yield read_element(ev)
+
+            # Libère l'événement lu ainsi que les éléments précédents déjà traités
+            ev.clear()
+            while ev.getprevious() is not None:
+                del ev.getparent()[0]
+
+    parser.close()
+
+
+def iter_expat(xml_data: str | bytes, chunk_size: int) -> Iterator[dict[str, str | None]]:
+    """
+    Analyse le XML CELCAT avec expat, sans construire d'arbre d'éléments
+
+    :param xml_data: Données XML CELCAT
+    :param chunk_size: Taille des morceaux de XML transmis à l'analyseur
+    :return: Champs de chaque événement
+    """
+    parser = xml.parsers.expat.ParserCreate()
+    parser.buffer_text = True
+
+    events = []
+    fields = None
+
+    # Éléments ouverts sous l'<event> courant : [nom, morceaux de texte, texte terminé]
+    # Comme Element.text, seul le texte précédant le premier enfant est conservé
+    stack = []
+
+    def start(name, attrs):
+        nonlocal fields
+
+        if fields is None:
+            if name == "event":
+                fields = {"id": attrs.get("id"), "date": attrs.get("date")}
+            return
+
+        if stack:
+            stack[-1][2] = True
+        stack.append([name, [], False])
+
+    def end(name):
+        nonlocal fields
+
+        if fields is None:
+            return
+
+        if not stack:
+            events.append(fields)
+            fields = None
+            return
+
+        _, parts, _ = stack.pop()
+        value = "".join(parts) if parts else None
+        depth = len(stack)
+
+        if depth == 0:
+            if name in EVENT_FIELDS:
+                fields.setdefault(name, value)
+        elif stack[0][0] == "resources":
+            if depth == 1 and name in RESOURCE_FIELDS:
+                fields.setdefault(name, value)
+            elif depth == 2 and name == "item" and stack[1][0] in RESOURCE_FIELDS:
+                fields.setdefault(stack[1][0] + "/item", value)
+
+    def data(content):
+        if stack and not stack[-1][2]:
+            stack[-1][1].append(content)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = data
+
+    for offset in range(0, len(xml_data), chunk_size):
+        parser.Parse(xml_data[offset:offset + chunk_size], False)
+
+        yield from events
+        events.clear()
+
+    parser.Parse(b"", True)
+    yield from events
+
+
+BACKENDS: dict[str, Callable[[str | bytes, int], Iterator[dict[str, str | None]]]] = {
+    "elementtree": iter_elementtree,
+    "expat": iter_expat,
+}
+if lxml_etree is not None:
+    BACKENDS["lxml"] = iter_lxml
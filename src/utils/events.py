@@ -0,0 +1,606 @@
+import hashlib
+import html
+import struct
+import sys
+import uuid
+import zlib
+
+from .celcat import BACKENDS
+from array import array
+from datetime import datetime, timedelta
+from operator import attrgetter
+from pytz import timezone
+from typing import Iterator
+
+
+# Fuseau horaire des agendas CELCAT
+PARIS = timezone("Europe/Paris")
+
+# Origine des timestamps, sans fuseau horaire
+EPOCH = datetime(1970, 1, 1)
+
+# Analyseur XML utilisé par défaut, le plus rapide d'après benchmarks/xml_to_ics.py
+DEFAULT_BACKEND = "elementtree"
+
+
+class Event:
+    """
+    Événement CELCAT, sous une forme compacte
+
+    Les dates sont des timestamps (secondes depuis l'epoch), les textes sont
+    partagés entre les événements d'un même agenda.
+    """
+    __slots__ = ("id", "start", "end", "module", "category", "room", "group", "notes", "prettytimes")
+
+    def __init__(
+        self,
+        id: str,
+        start: int,
+        end: int,
+        module: str | None = None,
+        category: str | None = None,
+        room: str | None = None,
+        group: str | None = None,
+        notes: str | None = None,
+        prettytimes: str | None = None,
+    ) -> None:
+        """
+        Initialisation de la classe
+
+        :param id: ID de l'événement CELCAT
+        :param start: Début de l'événement (timestamp)
+        :param end: Fin de l'événement (timestamp)
+        :param module: Module
+        :param category: Type de cours (CM, TD, TP, ...)
+        :param room: Salle
+        :param group: Groupe
+        :param notes: Remarques
+        :param prettytimes: Horaires, tels qu'affichés par CELCAT
+        """
+        self.id = id
+        self.start = start
+        self.end = end
+        self.module = module
+        self.category = category
+        self.room = room
+        self.group = group
+        self.notes = notes
+        self.prettytimes = prettytimes
+
+
+    def to_dict(self) -> dict[str, str | int | None]:
+        """
+        Convertit l'événement en dictionnaire, pour les réponses JSON et MessagePack
+
+        :return: Champs de l'événement
+        """
+        return {
+            "id": self.id,
+            "start": self.start,
+            "end": self.end,
+            "module": self.module,
+            "category": self.category,
+            "room": self.room,
+            "group": self.group,
+            "notes": self.notes,
+            "prettytimes": self.prettytimes,
+        }
+
+
+    def __repr__(self) -> str:
+        return f"<Event id={self.id!r} start={self.start} end={self.end} module={self.module!r}>"
+
+
+class Calendar:
+    """
+    Agenda d'un groupe : liste d'événements, sérialisable sous une forme compacte
+
+    Format sérialisé (little-endian) :
+    - en-tête : version, compression, nombre d'événements, taille de la table des textes
+    - table des textes, séparés par un caractère nul
+    - colonnes : débuts et fins (int64), puis un index dans la table des textes (uint32)
+      par champ texte, 0 correspondant à None
+    """
+    VERSION = 1
+
+    # Champs textes, dans l'ordre des colonnes sérialisées
+    FIELDS = ("id", "module", "category", "room", "group", "notes", "prettytimes")
+
+    HEADER = struct.Struct("<BBII")
+
+    # Taille approximative d'un événement en mémoire (objet, timestamps, références)
+    EVENT_SIZE = 192
+
+    __slots__ = ("events", "weeks", "stale", "digest")
+
+    def __init__(self, events: list[Event], stale: bool = False, digest: str | None = None) -> None:
+        """
+        Initialisation de la classe
+
+        :param events: Événements de l'agenda, triés par date de début
+        :param stale: Vrai pour la dernière version connue, servie car CELCAT est indisponible
+        :param digest: Empreinte des événements sérialisés, identifiant cette version de l'agenda
+        """
+        self.events = events
+        self.stale = stale
+        self.digest = digest
+
+        # Index des événements par semaine ISO, construit à la première recherche
+        self.weeks: dict[int, tuple[int, int]] | None = None
+
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+
+    def __iter__(self) -> Iterator[Event]:
+        return iter(self.events)
+
+
+    @classmethod
+    def merge(cls, calendars: list["Calendar"]) -> "Calendar":
+        """
+        Fusionne plusieurs agendas, un événement présent dans plusieurs agendas n'étant conservé qu'une fois
+
+        Un même ID CELCAT pouvant être partagé par plusieurs séances, un événement est
+        identifié par son ID et sa date de début, comme pour son UID iCalendar.
+
+        :param calendars: Agendas à fusionner
+        :return: Agenda fusionné, trié par date de début, périmé si l'un des agendas l'est
+        """
+        events: dict[tuple[str, int], Event] = {}
+
+        for calendar in calendars:
+            for event in calendar.events:
+                events.setdefault((event.id, event.start), event)
+
+        digests = [calendar.digest for calendar in calendars]
+
+        return cls(
+            sorted(events.values(), key=attrgetter("start")),
+            stale=any(calendar.stale for calendar in calendars),
+            digest=hashlib.blake2b(":".join(digests).encode(), digest_size=16).hexdigest() if None not in digests else None,
+        )
+
+
+    def etag(self, start: int | None = None, end: int | None = None) -> str | None:
+        """
+        ETag de l'agenda rendu sur une période, connu avant la conversion des événements
+
+        :param start: Début de la période (timestamp)
+        :param end: Fin de la période (timestamp)
+        :return: ETag, ou None si l'empreinte de l'agenda est inconnue
+        """
+        if self.digest is None:
+            return None
+
+        if start is None and end is None:
+            return f'"{self.digest}"'
+
+        return f'"{hashlib.blake2b(f"{self.digest}:{start}:{end}".encode(), digest_size=16).hexdigest()}"'
+
+
+    @property
+    def size(self) -> int:
+        """
+        Taille approximative de l'agenda en mémoire, en octets
+
+        :return: Taille en octets
+        """
+        return len(self.events) * self.EVENT_SIZE
+
+
+    def index(self) -> dict[int, tuple[int, int]]:
+        """
+        Construit l'index des événements par semaine ISO (du lundi au dimanche, heure de Paris)
+
+        Les événements étant triés par date de début, chaque semaine correspond
+        à une tranche de la liste des événements.
+
+        :return: Tranche [début, fin) de la liste des événements, par numéro de semaine
+        """
+        weeks: dict[int, tuple[int, int]] = {}
+        offsets: dict[int, int] = {}
+
+        for i, event in enumerate(self.events):
+            week = week_number(event.start, offsets)
+            first, _ = weeks.get(week, (i, i))
+            weeks[week] = (first, i + 1)
+
+        return weeks
+
+
+    def between(self, start: int | None = None, end: int | None = None) -> list[Event]:
+        """
+        Retourne les événements d'une période, sans parcourir tout l'agenda
+
+        Seules les semaines couvertes par la période sont lues dans l'index.
+
+        :param start: Début de la période (timestamp), None pour le début de l'agenda
+        :param end: Fin de la période (timestamp, exclue), None pour la fin de l'agenda
+        :return: Événements commençant dans la période, triés par date de début
+        """
+        if self.weeks is None:
+            self.weeks = self.index()
+
+        if not self.weeks:
+            return []
+
+        # Bornes ramenées à la durée de l'agenda : seules des dates connues sont converties en semaines
+        earliest, latest = self.events[0].start, self.events[-1].start + 1
+        start = earliest if start is None else min(max(start, earliest), latest)
+        end = latest if end is None else min(max(end, earliest), latest)
+
+        if start >= end:
+            return []
+
+        offsets: dict[int, int] = {}
+        first = week_number(start, offsets)
+        last = week_number(end - 1, offsets)
+
+        events = []
+        for week in range(first, last + 1):
+            if week in self.weeks:
+                lower, upper = self.weeks[week]
+                events.extend(self.events[lower:upper])
+
+        return [
+            event
+            for event in events
+            if start <= event.start < end
+        ]
+
+
+    def dumps(self, compress: bool = True) -> bytes:
+        """
+        Sérialise l'agenda
+
+        :param compress: Compresse les données (zlib)
+        :return: Données sérialisées
+        """
+        strings: dict[str, int] = {}
+        starts = array("q", (event.start for event in self.events))
+        ends = array("q", (event.end for event in self.events))
+        columns = []
+
+        for field in self.FIELDS:
+            column = array("I")
+
+            for event in self.events:
+                value = getattr(event, field)
+                column.append(0 if value is None else strings.setdefault(value, len(strings) + 1))
+
+            columns.append(column)
+
+        if sys.byteorder == "big":
+            for column in (starts, ends, *columns):
+                column.byteswap()
+
+        table = "\0".join(strings).encode()
+        body = b"".join([table, starts.tobytes(), ends.tobytes(), *(column.tobytes() for column in columns)])
+
+        if compress:
+            body = zlib.compress(body, 6)
+
+        return self.HEADER.pack(self.VERSION, compress, len(self.events), len(table)) + body
+
+
+    @classmethod
+    def loads(cls, data: bytes) -> "Calendar":
+        """
+        Désérialise un agenda
+
+        :param data: Données sérialisées
+        :return: Agenda
+        :raises ValueError: Si les données sont invalides ou d'une autre version
+        """
+        try:
+            version, compressed, count, size = cls.HEADER.unpack_from(data)
+        except struct.error as e:
+            raise ValueError(f"Agenda invalide : {e}") from e
+
+        if version != cls.VERSION:
+            raise ValueError(f"Version d'agenda inconnue : {version}")
+
+        body = memoryview(data)[cls.HEADER.size:]
+        if compressed:
+            try:
+                body = memoryview(zlib.decompress(body))
+            except zlib.error as e:
+                raise ValueError(f"Agenda invalide : {e}") from e
+
+        if len(body) != size + count * (16 + 4 * len(cls.FIELDS)):
+            raise ValueError("Agenda invalide : taille incorrecte")
+
+        strings = [None, *bytes(body[:size]).decode().split("\0")]
+        offset = size
+
+        columns = []
+        for typecode in ("q", "q", *("I" for _ in cls.FIELDS)):
+            column = array(typecode)
+            column.frombytes(body[offset:offset + count * column.itemsize])
+            columns.append(column)
+            offset += count * column.itemsize
+
+        if sys.byteorder == "big":
+            for column in columns:
+                column.byteswap()
+
+        starts, ends, ids, modules, categories, rooms, groups, notes, prettytimes = columns
+
+        return cls([
+            Event(
+                strings[ids[i]],
+                starts[i],
+                ends[i],
+                strings[modules[i]],
+                strings[categories[i]],
+                strings[rooms[i]],
+                strings[groups[i]],
+                strings[notes[i]],
+                strings[prettytimes[i]],
+            )
+            for i in range(count)
+        ])
+
+
+def first_text(fields: dict[str, str | None], names: tuple[str, ...]) -> str | None:
+    """
+    Trouve le premier texte non vide parmi les champs donnés
+
+    :param fields: Champs de l'événement
+    :type fields: dict[str, str | None]
+    :param names: Noms des champs à vérifier, par ordre de priorité
+    :type names: tuple[str, ...]
+    :return: Texte trouvé ou None
+    :rtype: str | None
+    """
+    for name in names:
+        text = fields.get(name)
+
+        if text and text.strip():
+            return html.unescape(text.strip())
+
+    return None
+
+
+def parse_date(value: str, dates: dict[str, datetime | None]) -> datetime | None:
+    """
+    Analyse une date de début de semaine CELCAT (DD/MM/YYYY), en réutilisant les dates déjà analysées
+
+    :param value: Date CELCAT
+    :type value: str
+    :param dates: Dates déjà analysées
+    :type dates: dict[str, datetime | None]
+    :return: Date ou None si elle est invalide
+    :rtype: datetime | None
+    """
+    if value not in dates:
+        try:
+            dates[value] = datetime.strptime(value, "%d/%m/%Y")
+        except Exception:
+            dates[value] = None
+
+    return dates[value]
+
+
+def parse_time(value: str, times: dict[str, tuple[int, int] | None]) -> tuple[int, int] | None:
+    """
+    Analyse une heure CELCAT (HH:MM), en réutilisant les heures déjà analysées
+
+    :param value: Heure CELCAT
+    :type value: str
+    :param times: Heures déjà analysées
+    :type times: dict[str, tuple[int, int] | None]
+    :return: Heure et minute, ou None si l'heure est invalide
+    :rtype: tuple[int, int] | None
+    """
+    if value not in times:
+        try:
+            parsed = datetime.strptime(value, "%H:%M")
+            times[value] = (parsed.hour, parsed.minute)
+        except Exception:
+            times[value] = None
+
+    return times[value]
+
+
+def local_timestamp(dt: datetime, offsets: dict[datetime, int]) -> int:
+    """
+    Convertit une date locale (Europe/Paris) en timestamp, en réutilisant le décalage horaire de chaque jour
+
+    Les cours ont lieu en journée, jamais pendant un changement d'heure : le décalage
+    calculé à midi vaut pour toute la journée.
+
+    :param dt: Date locale, sans fuseau horaire
+    :type dt: datetime
+    :param offsets: Décalages horaires déjà calculés, par jour
+    :type offsets: dict[datetime, int]
+    :return: Timestamp
+    :rtype: int
+    """
+    day = dt.replace(hour=0, minute=0)
+
+    if day not in offsets:
+        offsets[day] = int(PARIS.localize(day.replace(hour=12)).utcoffset().total_seconds())
+
+    return int((dt - EPOCH).total_seconds()) - offsets[day]
+
+
+def read_event(fields: dict[str, str | None], dates: dict, times: dict, strings: dict, offsets: dict) -> Event | None:
+    """
+    Construit un événement à partir des champs lus par l'analyseur XML
+
+    :param fields: Champs de l'événement
+    :type fields: dict[str, str | None]
+    :param dates: Dates de début de semaine déjà analysées
+    :type dates: dict
+    :param times: Heures déjà analysées
+    :type times: dict
+    :param strings: Textes déjà rencontrés, partagés entre les événements
+    :type strings: dict
+    :param offsets: Décalages horaires déjà calculés, par jour
+    :type offsets: dict
+    :return: Événement ou None si l'événement est invalide
+    :rtype: Event | None
+    """
+    # --- Get base date (week start) and day offset ---
+    date_attr = fields["date"]
+    if not date_attr:
+        return None
+
+    base_date = parse_date(date_attr, dates)
+    if base_date is None:
+        return None
+
+    # CELCAT stores <day>0</day> for Monday, 1=Tuesday, etc.
+    day = fields.get("day")
+    day_offset = int(day) if (day and day.isdigit()) else 0
+    event_date = base_date + timedelta(days=day_offset)
+
+    # --- Times ---
+    start_time = first_text(fields, ("starttime", "startTime"))
+    end_time = first_text(fields, ("endtime", "endTime"))
+    if not (start_time and end_time):
+        return None
+
+    start = parse_time(start_time, times)
+    end = parse_time(end_time, times)
+    if start is None or end is None:
+        return None
+
+    start_dt = event_date.replace(hour=start[0], minute=start[1])
+    end_dt = event_date.replace(hour=end[0], minute=end[1])
+
+    if end_dt <= start_dt:
+        end_dt = start_dt + timedelta(hours=1)
+
+    def intern(value: str | None) -> str | None:
+        return value if value is None else strings.setdefault(value, value)
+
+    return Event(
+        id=fields["id"] or str(uuid.uuid4()),
+        start=local_timestamp(start_dt, offsets),
+        end=local_timestamp(end_dt, offsets),
+        module=intern(first_text(fields, ("module/item", "module"))),
+        category=intern(first_text(fields, ("category",))),  # CM / TD / TP etc.
+        room=intern(first_text(fields, ("room/item", "room"))),
+        group=intern(first_text(fields, ("group/item", "group"))),
+        notes=intern(first_text(fields, ("notes",))),
+        prettytimes=intern(first_text(fields, ("prettytimes",))),
+    )
+
+
+def parse_events(xml_data: str | bytes, chunk_size: int = 64 * 1024, backend: str = None) -> Iterator[Event]:
+    """
+    Analyse les données XML CELCAT, événement par événement
+
+    :param xml_data: Données XML CELCAT
+    :type xml_data: str | bytes
+    :param chunk_size: Taille des morceaux de XML transmis à l'analyseur
+    :type chunk_size: int
+    :param backend: Analyseur XML à utiliser (elementtree, expat ou lxml)
+    :type backend: str, optional
+    :return: Événements valides de l'agenda
+    :rtype: Iterator[Event]
+    """
+    dates: dict[str, datetime | None] = {}
+    times: dict[str, tuple[int, int] | None] = {}
+    strings: dict[str, str] = {}
+    offsets: dict[datetime, int] = {}
+
+    for fields in BACKENDS[backend or DEFAULT_BACKEND](xml_data, chunk_size):
+        event = read_event(fields, dates, times, strings, offsets)
+
+        if event:
+            yield event
+
+
+def parse_calendar(xml_data: str | bytes, backend: str = None) -> Calendar:
+    """
+    Analyse les données XML CELCAT en un agenda, trié par date de début
+
+    :param xml_data: Données XML CELCAT
+    :type xml_data: str | bytes
+    :param backend: Analyseur XML à utiliser (elementtree, expat ou lxml)
+    :type backend: str, optional
+    :return: Agenda
+    :rtype: Calendar
+    """
+    return Calendar(sorted(parse_events(xml_data, backend=backend), key=attrgetter("start")))
+
+
+def dump_calendar(xml_data: str | bytes) -> bytes:
+    """
+    Analyse les données XML CELCAT et retourne l'agenda sérialisé, sans compression
+
+    Utilisable dans un processus séparé (ProcessPoolExecutor) : seul l'agenda compact
+    est transmis au processus principal.
+
+    :param xml_data: Données XML CELCAT
+    :type xml_data: str | bytes
+    :return: Agenda sérialisé
+    :rtype: bytes
+    """
+    return parse_calendar(xml_data).dumps(compress=False)
+
+
+def local_datetime(timestamp: int, offsets: dict[int, int]) -> datetime:
+    """
+    Convertit un timestamp en date locale (Europe/Paris), sans fuseau horaire, en réutilisant
+    le décalage horaire de chaque jour
+
+    :param timestamp: Timestamp
+    :type timestamp: int
+    :param offsets: Décalages horaires déjà calculés, par jour (UTC)
+    :type offsets: dict[int, int]
+    :return: Date locale
+    :rtype: datetime
+    """
+    day = timestamp // 86400
+
+    if day not in offsets:
+        offsets[day] = int(datetime.fromtimestamp(day * 86400 + 43200, PARIS).utcoffset().total_seconds())
+
+    return EPOCH + timedelta(seconds=timestamp + offsets[day])
+
+
+def week_number(timestamp: int, offsets: dict[int, int]) -> int:
+    """
+    Numéro de la semaine ISO (du lundi au dimanche, heure de Paris) contenant un timestamp
+
+    Les semaines sont numérotées en continu, pour parcourir facilement une période.
+
+    :param timestamp: Timestamp
+    :type timestamp: int
+    :param offsets: Décalages horaires déjà calculés, par jour (UTC)
+    :type offsets: dict[int, int]
+    :return: Numéro de la semaine
+    :rtype: int
+    """
+    # Le 1er janvier de l'an 1 (ordinal 1) est un lundi
+    return (local_datetime(timestamp, offsets).toordinal() - 1) // 7
+
+
+def day_start(value: str) -> int:
+    """
+    Convertit une date (DD-MM-YYYY) en timestamp du début de cette journée, à Paris
+
+    :param value: Date
+    :type value: str
+    :return: Timestamp
+    :rtype: int
+    """
+    return int(PARIS.localize(datetime.strptime(value, "%d-%m-%Y")).timestamp())
+
+
+def day_end(value: str) -> int:
+    """
+    Convertit une date (DD-MM-YYYY) en timestamp de la fin de cette journée (exclue), à Paris
+
+    :param value: Date
+    :type value: str
+    :return: Timestamp
+    :rtype: int
+    """
+    return int(PARIS.localize(datetime.strptime(value, "%d-%m-%Y") + timedelta(days=1)).timestamp())
@@ -1,138 +1,116 @@
-import html
-import uuid
-import xml.etree.ElementTree as ET
+from .events import Calendar, Event, local_datetime, parse_calendar
+from datetime import datetime
+from typing import Iterable, Iterator
 
-from datetime import datetime, timedelta
 
-
-def find_first_text(elem: ET.Element, paths: list[str]) -> str | None:
-    """
-    Trouve le premier texte non vide dans les chemins donnés
-
-    :param elem: Element
-    :type elem: ET.Element
-    :param paths: Liste de chemins à vérifier
-    :type paths: list[str]
-    :return: Texte trouvé ou None
-    :rtype: str | None
+def format_datetime(dt: datetime) -> str:
     """
-    for p in paths:
-        n = elem.find(p)
+    Formate une date au format iCalendar (YYYYMMDDTHHMMSS), sans passer par strftime
 
-        if n is not None and n.text and n.text.strip():
-            return html.unescape(n.text.strip())
-
-    return None
+    :param dt: Date
+    :type dt: datetime
+    :return: Date formatée
+    :rtype: str
+    """
+    return f"{dt.year:04d}{dt.month:02d}{dt.day:02d}T{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
 
 
-async def convert_xml_to_ics(xml_data: bytes) -> str:
+def iter_ics(events: Iterable[Event]) -> Iterator[str]:
     """
-    Convertit les données XML CELCAT en format iCalendar (ICS)
+    Convertit les événements d'un agenda en format iCalendar (ICS), événement par événement
 
-    :param xml_data: Données XML CELCAT
-    :type xml_data: bytes
-    :return: Données iCalendar (ICS)
-    :rtype: str
+    Les morceaux produits, mis bout à bout, forment le fichier ICS complet.
+
+    :param events: Événements de l'agenda
+    :type events: Iterable[Event]
+    :return: Morceaux du fichier iCalendar (en-tête, événements, fin)
+    :rtype: Iterator[str]
     """
-    tree = ET.ElementTree(ET.fromstring(xml_data))
-    root = tree.getroot()
+    # Calculés une seule fois par conversion
+    dtstamp = datetime.now().strftime("%Y%m%dT%H%M%SZ")
+    offsets: dict[int, int] = {}
 
     # Prepare iCalendar
-    ics_lines = [
+    yield "\r\n".join([
         "BEGIN:VCALENDAR",
         "PRODID:-//ReverseURCACelcatAPI//EN",
         "VERSION:2.0",
         "CALSCALE:GREGORIAN",
         "METHOD:PUBLISH",
+    ]) + "\r\n"
+
+    for event in events:
+        yield render_event(event, dtstamp, offsets)
+
+    yield "END:VCALENDAR"
+
+
+def render_event(event: Event, dtstamp: str, offsets: dict) -> str:
+    """
+    Convertit un événement en bloc VEVENT
+
+    :param event: Événement
+    :type event: Event
+    :param dtstamp: Horodatage de la conversion
+    :type dtstamp: str
+    :param offsets: Décalages horaires déjà calculés, par jour
+    :type offsets: dict
+    :return: Bloc VEVENT (terminé par un saut de ligne)
+    :rtype: str
+    """
+    summary = f"{event.module} {event.category}"
+
+    # --- Description (no RawWeeks) ---
+    parts = []
+    if event.group:
+        parts.append(f"• {event.group}")
+    if event.notes:
+        parts.append(f"• {event.notes}")
+    if event.prettytimes:
+        parts.append(f"• {event.prettytimes}")
+    description = "\\n".join(parts) if parts else None
+
+    # --- UID / timestamps ---
+    dtstart = format_datetime(local_datetime(event.start, offsets))
+    uid = f"{event.id}-{dtstart[:13]}-celcat"
+
+    # --- ICS Event ---
+    ics_event = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART;TZID=Europe/Paris:{dtstart}",
+        f"DTEND;TZID=Europe/Paris:{format_datetime(local_datetime(event.end, offsets))}",
+        f"SUMMARY:{summary}",
     ]
+    if event.room:
+        ics_event.append(f"LOCATION:{event.room}")
+    if description:
+        ics_event.append(f"DESCRIPTION:{description}")
+    ics_event.append("END:VEVENT")
+
+    return "\r\n".join(ics_event) + "\r\n"
+
+
+def render_ics(calendar: Calendar) -> bytes:
+    """
+    Convertit un agenda en format iCalendar (ICS)
+
+    :param calendar: Agenda
+    :type calendar: Calendar
+    :return: Données iCalendar (ICS) encodées en UTF-8
+    :rtype: bytes
+    """
+    return b"".join(chunk.encode() for chunk in iter_ics(calendar))
+
 
-    converted = 0
-
-    for ev in root.findall(".//event"):
-        # --- Get base date (week start) and day offset ---
-        date_attr = ev.get("date")
-        if not date_attr:
-            continue
-
-        try:
-            base_date = datetime.strptime(date_attr, "%d/%m/%Y")
-        except Exception:
-            continue
-
-        # CELCAT stores <day>0</day> for Monday, 1=Tuesday, etc.
-        day_tag = ev.find("day")
-        day_offset = (
-            int(day_tag.text) if (day_tag is not None and day_tag.text.isdigit()) else 0
-        )
-        event_date = base_date + timedelta(days=day_offset)
-
-        # --- Times ---
-        start_time = find_first_text(ev, ["starttime", "startTime"])
-        end_time = find_first_text(ev, ["endtime", "endTime"])
-        if not (start_time and end_time):
-            continue
-
-        try:
-            start_dt = datetime.strptime(
-                f"{event_date.strftime('%d/%m/%Y')} {start_time.strip()}",
-                "%d/%m/%Y %H:%M",
-            )
-            end_dt = datetime.strptime(
-                f"{event_date.strftime('%d/%m/%Y')} {end_time.strip()}",
-                "%d/%m/%Y %H:%M",
-            )
-        except Exception:
-            continue
-
-        if end_dt <= start_dt:
-            end_dt = start_dt + timedelta(hours=1)
-
-        # --- Location ---
-        location = find_first_text(ev, ["resources/room/item", "resources/room"])
-
-        # --- Additional info ---
-        group = find_first_text(ev, ["resources/group/item", "resources/group"])
-        notes = find_first_text(ev, ["notes"])
-        prettytimes = find_first_text(ev, ["prettytimes"])
-        category = find_first_text(ev, ["category"])  # CM / TD / TP etc.
-
-        module = find_first_text(ev, ["resources/module/item", "resources/module"])
-        summary = f"{module} {category}"
-
-        # --- Description (no RawWeeks) ---
-        parts = []
-        if group:
-            parts.append(f"• {group}")
-        if notes:
-            parts.append(f"• {notes}")
-        if prettytimes:
-            parts.append(f"• {prettytimes}")
-        description = "\\n".join(parts) if parts else None
-
-        # --- UID / timestamps ---
-        ev_id = ev.get("id") or str(uuid.uuid4())
-        uid = f"{ev_id}-{start_dt.strftime('%Y%m%dT%H%M')}-celcat"
-        dtstamp = datetime.now().strftime("%Y%m%dT%H%M%SZ")
-
-        # --- ICS Event ---
-        ics_event = [
-            "BEGIN:VEVENT",
-            f"UID:{uid}",
-            f"DTSTAMP:{dtstamp}",
-            f"DTSTART;TZID=Europe/Paris:{start_dt.strftime('%Y%m%dT%H%M%S')}",
-            f"DTEND;TZID=Europe/Paris:{end_dt.strftime('%Y%m%dT%H%M%S')}",
-            f"SUMMARY:{summary}",
-        ]
-        if location:
-            ics_event.append(f"LOCATION:{location}")
-        if description:
-            ics_event.append(f"DESCRIPTION:{description}")
-        ics_event.append("END:VEVENT")
-
-        ics_lines.extend(ics_event)
-        converted += 1
-
-    ics_lines.append("END:VCALENDAR")
-
-    ics_content = "\r\n".join(ics_lines)
-    return ics_content
+async def convert_xml_to_ics(xml_data: str | bytes) -> bytes:
+    """
+    Convertit les données XML CELCAT en format iCalendar (ICS)
+
+    :param xml_data: Données XML CELCAT
+    :type xml_data: str | bytes
+    :return: Données iCalendar (ICS) encodées en UTF-8
+    :rtype: bytes
+    """
+    return render_ics(parse_calendar(xml_data))